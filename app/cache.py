@@ -1,144 +1,364 @@
-from functools import lru_cache
-from typing import Any, Optional, Dict, List
+from functools import wraps
+from typing import Any, Optional, Dict, List, Hashable
 import time
-from datetime import datetime, timedelta
-from collections import OrderedDict
+from collections import OrderedDict, deque
 import threading
+import hashlib
+import heapq
+import itertools
+import sqlite3
+import logging
+import orjson
+import redis.asyncio as redis
+from fastapi.responses import Response
+from pydantic import TypeAdapter
+
+logger = logging.getLogger(__name__)
 
 class CacheEntry:
-    def __init__(self, value: Any, expiry: Optional[datetime] = None):
+    __slots__ = ('value', 'expiry')
+
+    def __init__(self, value: Any, expiry: Optional[float] = None):
         self.value = value
+        # Expiry is a time.monotonic() deadline
         self.expiry = expiry
-        self.last_accessed = datetime.utcnow()
-        self.access_count = 0
-
-    def is_expired(self) -> bool:
-        if self.expiry is None:
-            return False
-        return datetime.utcnow() > self.expiry
 
-    def update_access(self):
-        self.last_accessed = datetime.utcnow()
-        self.access_count += 1
+    def is_expired(self, now: float) -> bool:
+        return self.expiry is not None and now > self.expiry
 
-class InMemoryCache:
-    def __init__(self, maxsize: int = 1000, cleanup_interval: int = 300):
+class _CacheShard:
+    """A single LRU partition of InMemoryCache guarded by its own lock"""
+    def __init__(self, maxsize: int):
         self._cache: OrderedDict = OrderedDict()
         self.maxsize = maxsize
-        self.cleanup_interval = cleanup_interval
         self._lock = threading.Lock()
-        self._last_cleanup = datetime.utcnow()
+        # Evicted entries are recycled by set() instead of allocating new ones
+        self._entry_pool: deque = deque(maxlen=maxsize)
+        # (expiry, seq, key) min-heap; entries that were re-set or removed are skipped lazily
+        self._expiry_heap: List[tuple] = []
+        self._expiry_seq = itertools.count()
         self._stats = {
             'hits': 0,
             'misses': 0,
             'evictions': 0
         }
 
-    def _cleanup_expired(self):
-        """Remove expired entries and perform periodic cleanup"""
-        now = datetime.utcnow()
-        if (now - self._last_cleanup).total_seconds() < self.cleanup_interval:
-            return
+    def _new_entry(self, value: Any, expiry: Optional[float]) -> CacheEntry:
+        """Take an entry from the pool, or allocate one if the pool is empty"""
+        if not self._entry_pool:
+            return CacheEntry(value, expiry)
+        entry = self._entry_pool.popleft()
+        entry.value = value
+        entry.expiry = expiry
+        return entry
 
-        with self._lock:
-            expired_keys = [
-                key for key, entry in self._cache.items()
-                if entry.is_expired()
-            ]
-            for key in expired_keys:
-                del self._cache[key]
-                self._stats['evictions'] += 1
+    def _release(self, entry: CacheEntry) -> None:
+        """Drop the entry's value reference and return it to the pool"""
+        entry.value = None
+        self._entry_pool.append(entry)
 
-            self._last_cleanup = now
+    def _schedule_expiry(self, key: Hashable, expiry: float) -> None:
+        """Record a key's expiry deadline on the heap"""
+        heapq.heappush(self._expiry_heap, (expiry, next(self._expiry_seq), key))
+        if len(self._expiry_heap) > 2 * self.maxsize:
+            # Too many stale records: rebuild from the live entries
+            self._expiry_heap = [
+                (entry.expiry, next(self._expiry_seq), k)
+                for k, entry in self._cache.items()
+                if entry.expiry is not None
+            ]
+            heapq.heapify(self._expiry_heap)
 
-    def _evict_entries(self, num_to_evict: int = 1):
-        """Evict entries based on LRU and access frequency"""
-        if not self._cache:
+    def _cleanup_expired(self, now: float):
+        """Remove expired entries from this shard"""
+        # Peek at the earliest deadline without the lock so idle shards never contend;
+        # the loop below re-checks under the lock
+        try:
+            if self._expiry_heap[0][0] > now:
+                return
+        except IndexError:
             return
 
-        # Sort entries by last accessed time and access count
-        entries = list(self._cache.items())
-        entries.sort(key=lambda x: (
-            x[1].last_accessed,
-            -x[1].access_count  # Negative because we want to keep frequently accessed items
-        ))
+        with self._lock:
+            heap = self._expiry_heap
+            while heap and heap[0][0] <= now:
+                expiry, _, key = heapq.heappop(heap)
+                entry = self._cache.get(key)
+                # A key re-set with a new TTL still has its old record on the heap
+                if entry is not None and entry.expiry == expiry:
+                    del self._cache[key]
+                    self._release(entry)
+                    self._stats['evictions'] += 1
 
-        # Remove the oldest/least accessed entries
-        for key, _ in entries[:num_to_evict]:
-            del self._cache[key]
+    def _evict_entries(self, num_to_evict: int = 1):
+        """Evict the least recently used entries"""
+        # get() keeps the OrderedDict in LRU order, so the oldest entries are at the front
+        for _ in range(min(num_to_evict, len(self._cache))):
+            _, entry = self._cache.popitem(last=False)
+            self._release(entry)
             self._stats['evictions'] += 1
 
-    def get(self, key: str) -> Optional[Any]:
-        """Get a value from cache with access tracking"""
-        self._cleanup_expired()
-
+    def get(self, key: Hashable, now: float) -> Optional[Any]:
         with self._lock:
             if key not in self._cache:
                 self._stats['misses'] += 1
                 return None
 
             entry = self._cache[key]
-            if entry.is_expired():
+            if entry.is_expired(now):
                 del self._cache[key]
+                self._release(entry)
                 self._stats['evictions'] += 1
                 self._stats['misses'] += 1
                 return None
 
-            # Update access statistics
-            entry.update_access()
             self._stats['hits'] += 1
 
             # Move to end (most recently used)
             self._cache.move_to_end(key)
             return entry.value
 
-    def set(self, key: str, value: Any, ttl_seconds: Optional[int] = None) -> None:
-        """Set a value in cache with automatic eviction if needed"""
-        self._cleanup_expired()
-
+    def set(self, key: Hashable, value: Any, expiry: Optional[float]) -> None:
         with self._lock:
-            # If cache is full, evict entries
-            if len(self._cache) >= self.maxsize:
-                self._evict_entries()
+            entry = self._cache.get(key)
+            if entry is not None:
+                # Re-setting an existing key reuses its entry and must not evict another one
+                self._cache.move_to_end(key)
+                entry.value = value
+                entry.expiry = expiry
+            else:
+                if len(self._cache) >= self.maxsize:
+                    # If cache is full, evict entries
+                    self._evict_entries()
+                self._cache[key] = self._new_entry(value, expiry)
 
-            expiry = None
-            if ttl_seconds is not None:
-                expiry = datetime.utcnow() + timedelta(seconds=ttl_seconds)
+            if expiry is not None:
+                self._schedule_expiry(key, expiry)
 
-            self._cache[key] = CacheEntry(value, expiry)
-
-    def delete(self, key: str) -> None:
-        """Delete a specific key from cache"""
+    def delete(self, key: Hashable) -> None:
         with self._lock:
-            if key in self._cache:
-                del self._cache[key]
+            entry = self._cache.pop(key, None)
+            if entry is not None:
+                self._release(entry)
 
     def clear(self) -> None:
-        """Clear all entries from cache"""
         with self._lock:
             self._cache.clear()
+            self._expiry_heap.clear()
             self._stats = {
                 'hits': 0,
                 'misses': 0,
                 'evictions': 0
             }
 
+class InMemoryCache:
+    def __init__(self, maxsize: int = 1000, cleanup_interval: int = 300, shards: int = 16):
+        # Keys are striped across independently locked shards so unrelated keys never contend
+        self._shards = [_CacheShard(max(1, maxsize // shards)) for _ in range(shards)]
+        self.maxsize = maxsize
+        self.cleanup_interval = cleanup_interval
+        # Expired entries are swept in the background; get() still drops them lazily
+        self._cleanup_thread = threading.Thread(target=self._cleanup_loop, daemon=True)
+        self._cleanup_thread.start()
+
+    def _shard(self, key: Hashable) -> _CacheShard:
+        return self._shards[hash(key) % len(self._shards)]
+
+    def _cleanup_loop(self):
+        """Periodically remove expired entries from every shard"""
+        while True:
+            time.sleep(self.cleanup_interval)
+            now = time.monotonic()
+            for shard in self._shards:
+                shard._cleanup_expired(now)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Get a value from cache with access tracking"""
+        return self._shard(key).get(key, time.monotonic())
+
+    def set(self, key: Hashable, value: Any, ttl_seconds: Optional[int] = None) -> None:
+        """Set a value in cache with automatic eviction if needed"""
+        expiry = None
+        if ttl_seconds is not None:
+            expiry = time.monotonic() + ttl_seconds
+
+        self._shard(key).set(key, value, expiry)
+
+    def delete(self, key: Hashable) -> None:
+        """Delete a specific key from cache"""
+        self._shard(key).delete(key)
+
+    def clear(self) -> None:
+        """Clear all entries from cache"""
+        for shard in self._shards:
+            shard.clear()
+
     def get_stats(self) -> Dict[str, int]:
         """Get cache statistics"""
-        return self._stats.copy()
+        stats = {
+            'hits': 0,
+            'misses': 0,
+            'evictions': 0
+        }
+        for shard in self._shards:
+            for name, value in shard._stats.items():
+                stats[name] += value
+        return stats
 
     def get_size(self) -> int:
         """Get current cache size"""
-        return len(self._cache)
+        return sum(len(shard._cache) for shard in self._shards)
 
 # Create a global cache instance
 cache = InMemoryCache()
 
+class PersistentCache:
+    """JSON values in a SQLite file, for results that should survive restarts"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        # Opened on first use so importing modules does not create the file; callers hold _lock
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB NOT NULL)"
+            )
+        return self._conn
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            row = self._connection().execute(
+                "SELECT value FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+        return orjson.loads(row[0]) if row else None
+
+    def set(self, key: str, value: Any) -> None:
+        data = orjson.dumps(value)
+        with self._lock:
+            self._connection().execute(
+                "INSERT OR REPLACE INTO cache (key, value) VALUES (?, ?)", (key, data)
+            )
+
+class RedisCache:
+    """Bytes values in Redis, shared by every worker process and pod.
+
+    Disabled until connected with a URL; Redis errors are logged and treated as misses.
+    """
+
+    def __init__(self, max_connections: int = 20):
+        self.max_connections = max_connections
+        self._client: Optional[redis.Redis] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self._client is not None
+
+    async def connect(self, url: Optional[str]) -> None:
+        if url and self._client is None:
+            pool = redis.ConnectionPool.from_url(url, max_connections=self.max_connections)
+            self._client = redis.Redis(connection_pool=pool)
+
+    async def disconnect(self) -> None:
+        if self._client is not None:
+            client, self._client = self._client, None
+            await client.aclose()
+
+    async def get(self, key: str) -> Optional[bytes]:
+        if self._client is None:
+            return None
+        try:
+            return await self._client.get(key)
+        except redis.RedisError as e:
+            logger.warning(f"Redis get failed for {key}: {str(e)}")
+            return None
+
+    async def set(self, key: str, value: bytes, ttl_seconds: int) -> None:
+        if self._client is None:
+            return
+        try:
+            await self._client.set(key, value, ex=ttl_seconds)
+        except redis.RedisError as e:
+            logger.warning(f"Redis set failed for {key}: {str(e)}")
+
+    async def delete_pattern(self, pattern: str) -> None:
+        if self._client is None:
+            return
+        try:
+            keys = [key async for key in self._client.scan_iter(match=pattern)]
+            if keys:
+                await self._client.delete(*keys)
+        except redis.RedisError as e:
+            logger.warning(f"Redis delete failed for {pattern}: {str(e)}")
+
+shared_cache = RedisCache()
+
 # Decorator for caching function results
 def cached(ttl_seconds: Optional[int] = None):
+    """Cache the awaited result of an async method in the global cache.
+
+    The key covers the method name and every argument except ``self``.
+    """
     def decorator(func):
-        @lru_cache(maxsize=1000)
-        def wrapper(*args, **kwargs):
-            return func(*args, **kwargs)
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            # The raw 16-byte digest is a valid key, so skip hex-encoding it
+            key = hashlib.blake2b(
+                repr((func.__qualname__, args[1:], kwargs)).encode('utf-8'),
+                digest_size=16
+            ).digest()
+            hit = cache.get(key)
+            if hit is not None:
+                return hit
+            result = await func(*args, **kwargs)
+            cache.set(key, result, ttl_seconds)
+            return result
+        return wrapper
+    return decorator
+
+# Bumped to invalidate a namespace in the local cache; stale keys then age out
+_namespace_generations: Dict[str, int] = {}
+
+async def invalidate_namespace(namespace: str) -> None:
+    """Drop every response cached by ``cache_config`` under a namespace"""
+    _namespace_generations[namespace] = _namespace_generations.get(namespace, 0) + 1
+    await shared_cache.delete_pattern(f"{namespace}:*")
+
+def cache_config(namespace: str, ttl_seconds: int, response_model: Any):
+    """Cache a read endpoint's JSON response until its namespace is invalidated.
+
+    Responses are keyed on the endpoint and its plain-valued arguments (path and query
+    parameters; sessions and requests are skipped) and stored in Redis when it is
+    connected, otherwise in the local cache. The result is validated against
+    ``response_model`` and encoded once, so hits return the cached bytes as they are.
+    """
+    adapter = TypeAdapter(response_model)
+
+    def decorator(func):
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            params = sorted(
+                (name, value) for name, value in kwargs.items()
+                if value is None or isinstance(value, (str, int, float, bool))
+            )
+            key = f"{namespace}:{func.__name__}:{params!r}"
+            local_key = (_namespace_generations.get(namespace, 0), key)
+
+            if shared_cache.enabled:
+                body = await shared_cache.get(key)
+            else:
+                body = cache.get(local_key)
+            if body is None:
+                result = await func(*args, **kwargs)
+                body = adapter.dump_json(adapter.validate_python(result, from_attributes=True))
+                if shared_cache.enabled:
+                    await shared_cache.set(key, body, ttl_seconds)
+                else:
+                    cache.set(local_key, body, ttl_seconds)
+            return Response(content=body, media_type="application/json")
         return wrapper
-    return decorator 
\ No newline at end of file
+    return decorator
@@ -1,13 +1,24 @@
 import tempfile
 import os
-import subprocess
-import json
-from typing import Dict, List, Tuple, Any
+import asyncio
+import threading
+import hashlib
+import multiprocessing
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from concurrent.futures import ProcessPoolExecutor
 import ast
 import re
 from .schemas import Issue, AnalysisMetrics
-from .cache import cache, cached
-import hashlib
+from .cache import cached, PersistentCache
+import pylint
+import flake8
+import bandit
+from pylint.lint import Run as PylintRun
+from pylint.reporters import CollectingReporter
+from flake8.api import legacy as flake8_api
+from flake8.formatting.base import BaseFormatter
+from bandit.core import config as bandit_config
+from bandit.core import manager as bandit_manager
 # import transformers  # Commented out as not needed
 import joblib
 import openai
@@ -17,23 +28,150 @@ OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
 if not OPENAI_API_KEY:
     raise ValueError("OPENAI_API_KEY environment variable is not set")
 
+# The linters run in-process, so bandit's configuration is loaded once at import and
+# flake8's once per thread, since a style guide holds the state of the run in progress
+_BANDIT_CONFIG = bandit_config.BanditConfig()
+_FLAKE8_LOCAL = threading.local()
+_PYLINT_LOCK = threading.Lock()
+
+# Part of every persisted lint result key; bump the leading number when the tool runners change
+ANALYZER_VERSION = f"1:pylint-{pylint.__version__}:flake8-{flake8.__version__}:bandit-{bandit.__version__}"
+
+# Linter results by code hash, kept across restarts and shared by all analyzer instances
+_LINT_RESULTS = PersistentCache(os.getenv("ANALYSIS_CACHE_PATH", "analysis_cache.sqlite"))
+
+# Linters are CPU-bound, so they run in separate processes once the app starts the pool
+_LINT_POOL: Optional[ProcessPoolExecutor] = None
+
+_GPT_PROMPT_TEMPLATE = """Given these code metrics:
+- Code size: {code_size} lines
+- Functions: {function_count}
+- Classes: {class_count}
+- Comment ratio: {comment_ratio}%
+- Complexity score: {complexity_score}
+- Pylint score: {pylint_score}
+Suggest 3 actionable tips to improve code quality. """
+
+# Fallback patterns for code that does not parse
+_DEF_RE = re.compile(r'def\s+\w+\s*\(')
+_CLASS_RE = re.compile(r'class\s+\w+')
+
+def _run_pylint(file_path: str) -> Dict:
+    """Run pylint analysis"""
+    try:
+        reporter = CollectingReporter()
+        # pylint keeps module-level astroid state, so only one run at a time
+        with _PYLINT_LOCK:
+            PylintRun([file_path], reporter=reporter, exit=False)
+        messages = reporter.messages
+
+        # Calculate pylint score (10 - (number of issues * 0.1))
+        score = max(0, 10 - (len(messages) * 0.1))
+
+        return {
+            'score': int(score),
+            'issues': [
+                Issue(
+                    type='error' if message.category == 'error' else 'warning',
+                    message=message.msg,
+                    line=message.line,
+                    column=message.column,
+                    rule_id=message.symbol
+                ).model_dump()  # Convert Issue object to dictionary
+                for message in messages
+            ]
+        }
+    except Exception as e:
+        return {'score': 0, 'issues': [], 'error': str(e)}
+
+def _run_flake8(file_path: str) -> Dict:
+    """Run flake8 analysis"""
+    try:
+        violations = []
+
+        class _CollectingFormatter(BaseFormatter):
+            def handle(self, error):
+                violations.append(error)
+
+        style_guide = getattr(_FLAKE8_LOCAL, 'style_guide', None)
+        if style_guide is None:
+            style_guide = _FLAKE8_LOCAL.style_guide = flake8_api.get_style_guide()
+        style_guide.init_report(_CollectingFormatter)
+        style_guide.check_files([file_path])
+
+        return {
+            'issues': [
+                Issue(
+                    type='error',
+                    message=violation.text,
+                    line=violation.line_number,
+                    column=violation.column_number,
+                    rule_id=violation.code
+                ).model_dump()  # Convert Issue object to dictionary
+                for violation in violations
+            ]
+        }
+    except Exception as e:
+        return {'issues': [], 'error': str(e)}
+
+def _run_bandit(file_path: str) -> Dict:
+    """Run bandit security analysis"""
+    try:
+        manager = bandit_manager.BanditManager(_BANDIT_CONFIG, 'file')
+        manager.discover_files([file_path])
+        manager.run_tests()
+
+        return {
+            'issues': [
+                Issue(
+                    type='error',
+                    message=issue.text,
+                    line=issue.lineno,
+                    column=None,
+                    rule_id=issue.test_id
+                ).model_dump()  # Convert Issue object to dictionary
+                for issue in manager.get_issue_list()
+            ]
+        }
+    except Exception as e:
+        return {'issues': [], 'error': str(e)}
+
+def start_lint_pool(max_workers: Optional[int] = None) -> None:
+    """Start the process pool the linters run in"""
+    global _LINT_POOL
+    if _LINT_POOL is None:
+        # Spawned rather than forked: a fork copies locks held by the app's threads (cache sweeper,
+        # executor threads, logging), and a child that inherits one held can deadlock
+        _LINT_POOL = ProcessPoolExecutor(
+            max_workers=max_workers or int(os.getenv("LINT_WORKERS", os.cpu_count() or 1)),
+            mp_context=multiprocessing.get_context("spawn")
+        )
+
+def shutdown_lint_pool() -> None:
+    """Stop the lint process pool; linters then run in worker threads"""
+    global _LINT_POOL
+    if _LINT_POOL is not None:
+        _LINT_POOL.shutdown()
+        _LINT_POOL = None
+
+async def _run_tool(tool: Callable[[str], Dict], file_path: str) -> Dict:
+    """Run one linter off the event loop, in the process pool when it is started"""
+    if _LINT_POOL is None:
+        return await asyncio.to_thread(tool, file_path)
+    return await asyncio.get_running_loop().run_in_executor(_LINT_POOL, tool, file_path)
+
 class CodeAnalyzer:
     def __init__(self):
         self.tools = {
-            'pylint': self._run_pylint,
-            'flake8': self._run_flake8,
-            'bandit': self._run_bandit
+            'pylint': _run_pylint,
+            'flake8': _run_flake8,
+            'bandit': _run_bandit
         }
-        self.cache_ttl = 3600  # Cache results for 1 hour
         # ML model and tokenizer (disabled)
         # self.ml_tokenizer = AutoTokenizer.from_pretrained("microsoft/codebert-base")
         # self.ml_model = AutoModel.from_pretrained("microsoft/codebert-base")
         # self.smell_clf = joblib.load("code_smell_classifier.pkl")
 
-    def _generate_cache_key(self, code: str) -> str:
-        """Generate a unique cache key for the code"""
-        return hashlib.md5(code.encode()).hexdigest()
-
     def get_codebert_embedding(self, code: str):
         # Disabled
         return None
@@ -46,19 +184,13 @@ class CodeAnalyzer:
             "ai_suggestions": []
         }
 
-    def get_gpt_suggestions(self, metrics: dict, code: str = "") -> str:
-        prompt = (
-            f"Given these code metrics:\n"
-            f"- Code size: {metrics['code_size']} lines\n"
-            f"- Functions: {metrics['function_count']}\n"
-            f"- Classes: {metrics['class_count']}\n"
-            f"- Comment ratio: {metrics['comment_ratio']}%\n"
-            f"- Complexity score: {metrics['complexity_score']}\n"
-            f"- Pylint score: {metrics['pylint_score']}\n"
-            f"Suggest 3 actionable tips to improve code quality. "
-            f"Here is the code:\n" + code if code else ""
-        )
-        response = openai.ChatCompletion.create(
+    @cached(ttl_seconds=86400)
+    async def get_gpt_suggestions(self, metrics: dict, code: str = "") -> str:
+        """Ask the chat model for tips. Identical code and metrics reuse the answer for 24 hours."""
+        prompt = _GPT_PROMPT_TEMPLATE.format(**metrics)
+        if code:
+            prompt += "Here is the code:\n" + code
+        response = await openai.ChatCompletion.acreate(
             model="gpt-3.5-turbo",
             api_key=OPENAI_API_KEY,
             messages=[{"role": "user", "content": prompt}],
@@ -72,173 +204,102 @@ class CodeAnalyzer:
         """
         Analyze code and return results. Results are cached for 1 hour.
         """
-        cache_key = self._generate_cache_key(code)
+        lint_key = f"{hashlib.sha256(code.encode('utf-8')).hexdigest()}:{ANALYZER_VERSION}"
+        # The result store is sqlite, so its reads and writes run off the event loop
+        results = await asyncio.to_thread(_LINT_RESULTS.get, lint_key)
+        if results is None:
+            results = await self._lint(code)
+            # Only complete runs are persisted, so a failed tool is retried next time
+            if not any('error' in tool_result for tool_result in results.values()):
+                await asyncio.to_thread(_LINT_RESULTS.set, lint_key, results)
+
+        # Calculate metrics
+        metrics = self._calculate_metrics(code)
         
-        # Check cache first
-        cached_result = cache.get(cache_key)
-        if cached_result is not None:
-            # Remove ml_prediction if present in cached result
-            if 'ml_prediction' in cached_result:
-                del cached_result['ml_prediction']
-            return cached_result
+        # Update pylint score with actual value
+        metrics.pylint_score = results['pylint']['score']
 
-        # Create temporary file for analysis
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.py', delete=False) as temp_file:
-            temp_file.write(code)
-            temp_file_path = temp_file.name
+        # Calculate scores (now pass bandit issues)
+        scores = self._calculate_scores(metrics, results['bandit']['issues'])
 
-        try:
-            # Run all analysis tools
-            results = {}
-            for tool_name, tool_func in self.tools.items():
-                results[tool_name] = await tool_func(temp_file_path)
-
-            # Calculate metrics
-            metrics = self._calculate_metrics(code)
-            
-            # Update pylint score with actual value
-            metrics.pylint_score = results['pylint']['score']
-
-            # Calculate scores (now pass bandit issues)
-            scores = self._calculate_scores(metrics, results['bandit']['issues'])
-
-            # Structure the response
-            result = {
-                'pylint_score': results['pylint']['score'],
-                'complexity_score': scores['complexity_score'],
-                'maintainability_score': scores['maintainability_score'],
-                'security_score': scores['security_score'],
-                'overall_score': scores['overall_score'],
-                'metrics': {
-                    'code_size': metrics.code_size,
-                    'function_count': metrics.function_count,
-                    'class_count': metrics.class_count,
-                    'comment_ratio': metrics.comment_ratio,
-                    'complexity_score': metrics.complexity_score,
-                    'pylint_score': metrics.pylint_score
-                },
-                'flake8_issues': results['flake8']['issues'],
-                'bandit_issues': results['bandit']['issues']
-            }
-
-            # ML-powered code smell/anti-pattern detection
-            ml_result = self.ml_code_smell_analysis(code)
-            result.update(ml_result)
-
-            # Ensure ml_prediction is never added to result
-            if 'ml_prediction' in result:
-                del result['ml_prediction']
-
-            # Add ChatGPT AI tips
-            try:
-                result['ai_tips'] = self.get_gpt_suggestions(metrics.model_dump(), code)
-            except Exception as e:
-                result['ai_tips'] = f"AI tips unavailable: {str(e)}"
-
-            # Cache the result
-            cache.set(cache_key, result, self.cache_ttl)
-            
-            return result
+        # Structure the response
+        result = {
+            'pylint_score': results['pylint']['score'],
+            'complexity_score': scores['complexity_score'],
+            'maintainability_score': scores['maintainability_score'],
+            'security_score': scores['security_score'],
+            'overall_score': scores['overall_score'],
+            'metrics': {
+                'code_size': metrics.code_size,
+                'function_count': metrics.function_count,
+                'class_count': metrics.class_count,
+                'comment_ratio': metrics.comment_ratio,
+                'complexity_score': metrics.complexity_score,
+                'pylint_score': metrics.pylint_score
+            },
+            'flake8_issues': results['flake8']['issues'],
+            'bandit_issues': results['bandit']['issues']
+        }
 
-        finally:
-            # Clean up temporary file
-            os.unlink(temp_file_path)
+        # ML-powered code smell/anti-pattern detection
+        ml_result = self.ml_code_smell_analysis(code)
+        result.update(ml_result)
 
-    async def _run_pylint(self, file_path: str) -> Dict:
-        """Run pylint analysis"""
-        try:
-            result = subprocess.run(
-                ['pylint', '--output-format=json', file_path],
-                capture_output=True,
-                text=True
-            )
-            
-            issues = json.loads(result.stdout) if result.stdout else []
-            
-            # Calculate pylint score (10 - (number of issues * 0.1))
-            score = max(0, 10 - (len(issues) * 0.1))
-            
-            return {
-                'score': int(score),
-                'issues': [
-                    Issue(
-                        type='error' if issue['type'] == 'error' else 'warning',
-                        message=issue['message'],
-                        line=issue['line'],
-                        column=issue['column'],
-                        rule_id=issue['symbol']
-                    ).model_dump()  # Convert Issue object to dictionary
-                    for issue in issues
-                ]
-            }
-        except Exception as e:
-            return {'score': 0, 'issues': [], 'error': str(e)}
+        # Ensure ml_prediction is never added to result
+        if 'ml_prediction' in result:
+            del result['ml_prediction']
 
-    async def _run_flake8(self, file_path: str) -> Dict:
-        """Run flake8 analysis"""
+        # Add ChatGPT AI tips
         try:
-            result = subprocess.run(
-                ['flake8', '--format=json', file_path],
-                capture_output=True,
-                text=True
-            )
-            
-            issues = json.loads(result.stdout) if result.stdout else []
-            
-            return {
-                'issues': [
-                    Issue(
-                        type='error',
-                        message=issue['message'],
-                        line=issue['line'],
-                        column=issue['column'],
-                        rule_id=issue['code']
-                    ).model_dump()  # Convert Issue object to dictionary
-                    for issue in issues
-                ]
-            }
+            result['ai_tips'] = await self.get_gpt_suggestions(metrics.model_dump(), code)
         except Exception as e:
-            return {'issues': [], 'error': str(e)}
+            result['ai_tips'] = f"AI tips unavailable: {str(e)}"
+
+        return result
+
+    async def _lint(self, code: str) -> Dict[str, Dict]:
+        """Run every linter on the code, returning each tool's results by name"""
+        # Create temporary file for analysis
+        with tempfile.NamedTemporaryFile(mode='w', suffix='.py', delete=False) as temp_file:
+            temp_file.write(code)
+            temp_file_path = temp_file.name
 
-    async def _run_bandit(self, file_path: str) -> Dict:
-        """Run bandit security analysis"""
         try:
-            result = subprocess.run(
-                ['bandit', '-f', 'json', file_path],
-                capture_output=True,
-                text=True
+            # Run all analysis tools concurrently
+            tool_results = await asyncio.gather(
+                *(_run_tool(tool_func, temp_file_path) for tool_func in self.tools.values())
             )
-            
-            issues = json.loads(result.stdout)['results'] if result.stdout else []
-            
-            return {
-                'issues': [
-                    Issue(
-                        type='error',
-                        message=issue['issue_text'],
-                        line=issue['line_number'],
-                        column=None,
-                        rule_id=issue['test_id']
-                    ).model_dump()  # Convert Issue object to dictionary
-                    for issue in issues
-                ]
-            }
-        except Exception as e:
-            return {'issues': [], 'error': str(e)}
+            return dict(zip(self.tools, tool_results))
+        finally:
+            # Clean up temporary file
+            os.unlink(temp_file_path)
 
     def _calculate_metrics(self, code: str) -> AnalysisMetrics:
         """Calculate code metrics"""
         lines = code.splitlines()
-        code_lines = [line for line in lines if line.strip() and not line.strip().startswith('#')]
-        comment_lines = [line for line in lines if line.strip().startswith('#')]
+        stripped = [line.strip() for line in lines]
+        code_lines = [line for line in stripped if line and not line.startswith('#')]
+        comment_count = sum(1 for line in stripped if line.startswith('#'))
         
-        # Count functions and classes
-        function_count = len(re.findall(r'def\s+\w+\s*\(', code))
-        class_count = len(re.findall(r'class\s+\w+', code))
+        # Count functions and classes in a single walk over one parse
+        try:
+            tree = ast.parse(code)
+        except (SyntaxError, ValueError, RecursionError, MemoryError):
+            # Unparseable snippets (bad syntax, NUL bytes, too deeply nested) still get a best-effort count
+            function_count = len(_DEF_RE.findall(code))
+            class_count = len(_CLASS_RE.findall(code))
+        else:
+            function_count = 0
+            class_count = 0
+            for node in ast.walk(tree):
+                if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                    function_count += 1
+                elif isinstance(node, ast.ClassDef):
+                    class_count += 1
         
         # Calculate comment ratio
         total_lines = len(lines)
-        comment_ratio = (len(comment_lines) / total_lines * 100) if total_lines > 0 else 0
+        comment_ratio = (comment_count / total_lines * 100) if total_lines > 0 else 0
         
         # Calculate complexity (simple metric based on function count and code size)
         complexity_score = (function_count * 2 + len(code_lines) * 0.1)
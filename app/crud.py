@@ -1,18 +1,33 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import func, insert, select
+from sqlalchemy.orm import Session, defer
 from datetime import datetime
-from . import models, schemas
-from typing import List, Optional
+from . import models
+from typing import Any, Dict, List, Optional, Tuple
 
-def create_analysis(db: Session, analysis: schemas.CodeAnalysis) -> models.CodeAnalysis:
+def create_analysis(db: Session, analysis: Dict[str, Any]) -> models.CodeAnalysis:
     """
-    Create a new code analysis record
+    Create a new code analysis record from its column values
     """
-    db_analysis = models.CodeAnalysis(**analysis.dict())
+    db_analysis = models.CodeAnalysis(**analysis)
     db.add(db_analysis)
+    # The id and server defaults come back with the INSERT (eager_defaults), so no refresh
     db.commit()
-    db.refresh(db_analysis)
     return db_analysis
 
+def create_analyses(db: Session, analyses: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Create several code analysis records, given as column values, in one transaction
+    """
+    if not analyses:
+        return []
+    # A bulk INSERT skips building ORM objects; the new ids come back in row order
+    stmt = insert(models.CodeAnalysis).returning(
+        models.CodeAnalysis.id, sort_by_parameter_order=True
+    )
+    ids = db.scalars(stmt, analyses).all()
+    db.commit()
+    return [{**analysis, "id": analysis_id} for analysis, analysis_id in zip(analyses, ids)]
+
 def get_analysis(db: Session, analysis_id: int) -> Optional[models.CodeAnalysis]:
     """
     Get a specific code analysis by ID
@@ -23,12 +38,16 @@ def get_analyses(
     db: Session,
     skip: int = 0,
     limit: int = 10,
-    repository: Optional[str] = None
+    repository: Optional[str] = None,
+    with_code: bool = True
 ) -> List[models.CodeAnalysis]:
     """
     Get a list of code analyses with pagination
     """
     query = db.query(models.CodeAnalysis)
+    if not with_code:
+        # The source text is the bulk of each row and list views don't show it
+        query = query.options(defer(models.CodeAnalysis.code, raiseload=True))
     if repository:
         query = query.filter(models.CodeAnalysis.repository == repository)
     return query.order_by(models.CodeAnalysis.created_at.desc())\
@@ -36,10 +55,53 @@ def get_analyses(
         .limit(limit)\
         .all()
 
+def get_analysis_code(db: Session, analysis_id: int):
+    """
+    Get only the id and source code of a specific analysis
+    """
+    return db.query(models.CodeAnalysis.id, models.CodeAnalysis.code)\
+        .filter(models.CodeAnalysis.id == analysis_id)\
+        .first()
+
 #adding a comment to check if the webhook is working
 def get_analyses_by_date_range(db: Session, start_date: datetime, end_date: datetime):
-    """Get all analyses within a date range"""
+    """Get all analyses within the half-open date range [start_date, end_date)"""
     return db.query(models.CodeAnalysis).filter(
         models.CodeAnalysis.created_at >= start_date,
-        models.CodeAnalysis.created_at <= end_date
-    ).all() 
\ No newline at end of file
+        models.CodeAnalysis.created_at < end_date
+    ).all() 
+
+def get_daily_analytics(db: Session, start_date: datetime, end_date: datetime):
+    """Get average scores per day for analyses in [start_date, end_date), oldest day first"""
+    table = models.CodeAnalysis.__table__
+    day = func.date(table.c.created_at).label("date")
+    # A Core select returns plain rows, skipping the ORM query machinery
+    stmt = select(
+        day,
+        func.avg(table.c.overall_score).label("overall_score"),
+        func.avg(table.c.maintainability_score).label("maintainability_score"),
+        func.avg(table.c.security_score).label("security_score"),
+        func.avg(table.c.complexity_score).label("complexity_score")
+    ).where(
+        table.c.created_at >= start_date,
+        table.c.created_at < end_date
+    ).group_by(day).order_by(day)
+    return db.execute(stmt).all()
+
+def get_cached_blobs(db: Session, repository: str, paths: List[str]) -> Dict[str, models.BlobCache]:
+    """Get cached file contents for the given paths of a repository, keyed by path"""
+    if not paths:
+        return {}
+    rows = db.query(models.BlobCache).filter(
+        models.BlobCache.repository == repository,
+        models.BlobCache.path.in_(paths)
+    ).all()
+    return {row.path: row for row in rows}
+
+def save_cached_blobs(db: Session, repository: str, blobs: Dict[str, Tuple[str, str]]) -> None:
+    """Insert or update cached file contents, given as path -> (etag, content)"""
+    if not blobs:
+        return
+    for path, (etag, content) in blobs.items():
+        db.merge(models.BlobCache(repository=repository, path=path, etag=etag, content=content))
+    db.commit()
@@ -1,21 +1,46 @@
+import asyncio
 import hmac
 import hashlib
-import json
 import logging
-from typing import Dict, Optional
+import re
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import quote
 from fastapi import HTTPException, Request
 import httpx
+import orjson
 from .code_analyzer import CodeAnalyzer
 from .database import get_db
-from . import crud, schemas
+from .cache import invalidate_namespace
+from . import crud, models
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Shape of a valid X-Hub-Signature-256 header
+_SIGNATURE_RE = re.compile(r'sha256=[0-9a-f]{64}')
+
+# File contents at a commit; the path is percent-encoded, keeping its slashes
+_RAW_CONTENT_URL = "https://raw.githubusercontent.com/{repo}/{sha}/{path}"
+
+# Upper bound on files fetched and analyzed at once for a single push
+MAX_CONCURRENT_FILES = 10
+
+# GitHub truncates the commit list and per-commit file lists in push payloads at this size
+PAYLOAD_LIST_LIMIT = 20
+
+# GraphQL caps the nodes a single query may request; larger commits use the REST path
+MAX_GRAPHQL_FILES = 250
+
 class GitHubWebhook:
-    def __init__(self, webhook_secret: str):
+    def __init__(self, webhook_secret: str, github_token: Optional[str] = None):
         self.webhook_secret = webhook_secret
+        # Keyed once; each request hashes with a copy instead of re-deriving the pads
+        self._hmac_template = hmac.new(webhook_secret.encode(), None, hashlib.sha256)
+        # GraphQL requires authentication, so batched content fetches are only used with a token
+        self.github_token = github_token
+        self._graphql_headers = {"Authorization": f"bearer {github_token}"} if github_token else {}
         self.code_analyzer = CodeAnalyzer()
         logger.info(f"Initialized GitHubWebhook with secret length: {len(webhook_secret) if webhook_secret else 0}")
 
@@ -33,7 +58,9 @@ class GitHubWebhook:
                 logger.error("No webhook secret configured")
                 return False
             
-            expected_signature = f"sha256={hmac.new(self.webhook_secret.encode(), payload, hashlib.sha256).hexdigest()}"
+            mac = self._hmac_template.copy()
+            mac.update(payload)
+            expected_signature = f"sha256={mac.hexdigest()}"
             logger.info(f"Expected signature: {expected_signature}")
             
             is_valid = hmac.compare_digest(signature, expected_signature)
@@ -43,7 +70,96 @@ class GitHubWebhook:
             logger.error(f"Error verifying signature: {str(e)}")
             return False
 
-    async def handle_push_event(self, payload: Dict, db) -> Dict:
+    def _changed_python_files(self, payload: Dict) -> Optional[List[str]]:
+        """List .py files added or modified by a push, or None if the payload may be truncated"""
+        commits = payload.get('commits') or [payload['head_commit']]
+        if len(commits) >= PAYLOAD_LIST_LIMIT:
+            return None
+
+        # Replay the commits in order so files removed later in the push are dropped
+        changed = {}
+        for commit in commits:
+            added = commit.get('added', [])
+            modified = commit.get('modified', [])
+            removed = commit.get('removed', [])
+            if max(len(added), len(modified), len(removed)) >= PAYLOAD_LIST_LIMIT:
+                return None
+            for path in added + modified:
+                changed[path] = None
+            for path in removed:
+                changed.pop(path, None)
+
+        return [path for path in changed if path.endswith('.py')]
+
+    async def _fetch_contents_graphql(
+        self,
+        client: httpx.AsyncClient,
+        repo_name: str,
+        commit_sha: str,
+        paths: List[str]
+    ) -> Dict[str, Optional[str]]:
+        """Fetch the contents of several files at a commit in one GraphQL query"""
+        owner, name = repo_name.split('/', 1)
+        variables = {"owner": owner, "name": name}
+        declarations = ["$owner: String!", "$name: String!"]
+        fields = []
+        for i, path in enumerate(paths):
+            variables[f"e{i}"] = f"{commit_sha}:{path}"
+            declarations.append(f"$e{i}: String!")
+            fields.append(f"f{i}: object(expression: $e{i}) {{ ... on Blob {{ text }} }}")
+        query = (
+            f"query({', '.join(declarations)}) {{ "
+            f"repository(owner: $owner, name: $name) {{ {' '.join(fields)} }} }}"
+        )
+
+        response = await client.post(
+            "/graphql",
+            json={"query": query, "variables": variables},
+            headers=self._graphql_headers
+        )
+        response.raise_for_status()
+        body = orjson.loads(response.content)
+        if body.get('errors'):
+            raise ValueError(f"GraphQL errors: {body['errors']}")
+
+        repository = body['data']['repository'] or {}
+        # Blob text is null for binary or oversized files; those are fetched individually
+        return {
+            path: (repository.get(f"f{i}") or {}).get('text')
+            for i, path in enumerate(paths)
+        }
+
+    async def _fetch_and_analyze(
+        self,
+        client: httpx.AsyncClient,
+        semaphore: asyncio.Semaphore,
+        repo_name: str,
+        commit_sha: str,
+        filename: str,
+        code: Optional[str] = None,
+        cached_blob: Optional[models.BlobCache] = None
+    ) -> Tuple[str, Dict, Optional[str]]:
+        """Fetch one file at the pushed commit (unless already fetched) and analyze it
+
+        Returns the code, its analysis and the new ETag if the contents were downloaded.
+        """
+        async with semaphore:
+            logger.info(f"Analyzing file: {filename}")
+            etag = None
+            if code is None:
+                # Get file contents using raw.githubusercontent.com
+                raw_url = _RAW_CONTENT_URL.format(repo=repo_name, sha=commit_sha, path=quote(filename))
+                headers = {"If-None-Match": cached_blob.etag} if cached_blob else None
+                file_response = await client.get(raw_url, headers=headers)
+                if file_response.status_code == 304:
+                    code = cached_blob.content
+                else:
+                    file_response.raise_for_status()
+                    code = file_response.text
+                    etag = file_response.headers.get('ETag')
+            return code, await self.code_analyzer.analyze(code), etag
+
+    async def handle_push_event(self, payload: Dict, db, client: httpx.AsyncClient) -> Dict:
         """Handle GitHub push event"""
         try:
             # Get repository details
@@ -51,81 +167,119 @@ class GitHubWebhook:
             commit_sha = payload['head_commit']['id']
             commit_message = payload['head_commit']['message']
             commit_author = payload['head_commit']['author']['name']
-            commit_date = payload['head_commit']['timestamp']
+            # GitHub sends ISO 8601 with a trailing Z, which fromisoformat only accepts from 3.11
+            commit_date = datetime.fromisoformat(payload['head_commit']['timestamp'].replace('Z', '+00:00'))
             
             logger.info(f"Processing push event for repository: {repo_name}, commit: {commit_sha}")
             
-            # Get file contents from GitHub
-            async with httpx.AsyncClient(follow_redirects=True) as client:
-                # Get list of files in the commit
-                files_response = await client.get(
-                    f"https://api.github.com/repos/{repo_name}/commits/{commit_sha}",
-                    headers={"Accept": "application/vnd.github.v3+json"}
-                )
+            python_files = self._changed_python_files(payload)
+            if python_files is None:
+                # Get list of files in the commit (the shared client has the API base URL and Accept header)
+                files_response = await client.get(f"/repos/{repo_name}/commits/{commit_sha}")
                 files_response.raise_for_status()
-                commit_data = files_response.json()
-                
-                analysis_results = []
-                
-                # Analyze each Python file in the commit
-                for file in commit_data['files']:
-                    if file['filename'].endswith('.py'):
-                        logger.info(f"Analyzing file: {file['filename']}")
-                        try:
-                            # Get file contents using raw.githubusercontent.com
-                            raw_url = f"https://raw.githubusercontent.com/{repo_name}/{commit_sha}/{file['filename']}"
-                            file_response = await client.get(raw_url)
-                            file_response.raise_for_status()
-                            code = file_response.text
-                            
-                            # Analyze the code
-                            analysis_result = await self.code_analyzer.analyze(code)
-                            
-                            # Convert issues to dictionaries
-                            flake8_issues = [issue.dict() if hasattr(issue, 'dict') else issue for issue in analysis_result['flake8_issues']]
-                            bandit_issues = [issue.dict() if hasattr(issue, 'dict') else issue for issue in analysis_result['bandit_issues']]
-                            
-                            # Create analysis record
-                            db_analysis = schemas.CodeAnalysis(
-                                code=code,
-                                created_at=commit_date,
-                                updated_at=commit_date,
-                                repository=repo_name,
-                                commit_sha=commit_sha,
-                                commit_message=commit_message,
-                                commit_author=commit_author,
-                                file_path=file['filename'],
-                                pylint_score=analysis_result['pylint_score'],
-                                complexity_score=analysis_result['complexity_score'],
-                                maintainability_score=analysis_result['maintainability_score'],
-                                security_score=analysis_result['security_score'],
-                                overall_score=analysis_result['overall_score'],
-                                metrics=schemas.AnalysisMetrics(**analysis_result['metrics']),
-                                flake8_issues=flake8_issues,
-                                bandit_issues=bandit_issues
-                            )
-                            
-                            # Save to database
-                            saved_analysis = crud.create_analysis(db, db_analysis)
-                            analysis_results.append(saved_analysis)
-                            logger.info(f"Successfully analyzed and saved results for {file['filename']}")
-                        except Exception as e:
-                            logger.error(f"Error analyzing file {file['filename']}: {str(e)}")
-                            continue
-                
-                return {
-                    "status": "success",
+                commit_data = orjson.loads(files_response.content)
+
+                python_files = [
+                    file['filename'] for file in commit_data['files']
+                    if file['filename'].endswith('.py')
+                ]
+
+            # Fetch all contents in one round trip when possible
+            contents = {}
+            if self.github_token and 0 < len(python_files) <= MAX_GRAPHQL_FILES:
+                try:
+                    contents = await self._fetch_contents_graphql(client, repo_name, commit_sha, python_files)
+                except Exception as e:
+                    logger.warning(f"GraphQL content fetch failed, falling back to raw files: {str(e)}")
+
+            # Files still to download are requested conditionally against their last ETag
+            cached_blobs = crud.get_cached_blobs(
+                db, repo_name, [filename for filename in python_files if contents.get(filename) is None]
+            )
+
+            # Fetch and analyze the files concurrently, at most MAX_CONCURRENT_FILES at a time
+            semaphore = asyncio.Semaphore(MAX_CONCURRENT_FILES)
+            file_results = await asyncio.gather(
+                *(self._fetch_and_analyze(client, semaphore, repo_name, commit_sha, filename,
+                                          contents.get(filename), cached_blobs.get(filename))
+                  for filename in python_files),
+                return_exceptions=True
+            )
+
+            # Save afterwards so the synchronous Session is never shared between tasks
+            pending = []
+            new_blobs = {}
+            for filename, file_result in zip(python_files, file_results):
+                if isinstance(file_result, BaseException):
+                    logger.error(f"Error analyzing file {filename}: {str(file_result)}")
+                    continue
+                code, analysis_result, etag = file_result
+                if etag:
+                    new_blobs[filename] = (etag, code)
+
+                # Column values straight from the analyzer, which already returns plain dicts
+                pending.append({
+                    "code": code,
+                    "created_at": commit_date,
+                    "updated_at": commit_date,
                     "repository": repo_name,
-                    "commit": commit_sha,
-                    "analyses": analysis_results
-                }
-                
+                    "commit_sha": commit_sha,
+                    "commit_message": commit_message,
+                    "commit_author": commit_author,
+                    "file_path": filename,
+                    "pylint_score": analysis_result['pylint_score'],
+                    "complexity_score": analysis_result['complexity_score'],
+                    "maintainability_score": analysis_result['maintainability_score'],
+                    "security_score": analysis_result['security_score'],
+                    "overall_score": analysis_result['overall_score'],
+                    "metrics": analysis_result['metrics'],
+                    "flake8_issues": analysis_result['flake8_issues'],
+                    "bandit_issues": analysis_result['bandit_issues']
+                })
+
+            # Save to database in one transaction, falling back to one row at a time
+            # so a single bad record does not drop the rest of the push
+            try:
+                analysis_results = crud.create_analyses(db, pending)
+            except Exception as e:
+                db.rollback()
+                logger.warning(f"Bulk insert failed, saving analyses individually: {str(e)}")
+                analysis_results = []
+                for analysis in pending:
+                    try:
+                        analysis_results.append(crud.create_analysis(db, analysis))
+                    except Exception as e:
+                        db.rollback()
+                        logger.error(f"Error saving analysis for {analysis['file_path']}: {str(e)}")
+            logger.info(f"Saved {len(analysis_results)} analyses for commit {commit_sha}")
+            if analysis_results:
+                await invalidate_namespace("analyses")
+
+            try:
+                crud.save_cached_blobs(db, repo_name, new_blobs)
+            except Exception as e:
+                db.rollback()
+                logger.warning(f"Error caching file contents: {str(e)}")
+
+            return {
+                "status": "success",
+                "repository": repo_name,
+                "commit": commit_sha,
+                "analyses": analysis_results
+            }
+
         except Exception as e:
             logger.error(f"Error processing push event: {str(e)}")
             raise HTTPException(status_code=500, detail=str(e))
 
-    async def process_webhook(self, request: Request, db) -> Dict:
+    async def process_webhook(self, request: Request, db, client: httpx.AsyncClient) -> Dict:
         """Process GitHub webhook event"""
+        # Reject missing or malformed signatures before reading or hashing the body
+        signature = request.headers.get('X-Hub-Signature-256')
+        if not signature or not _SIGNATURE_RE.fullmatch(signature):
+            logger.error("Missing or malformed webhook signature")
+            raise HTTPException(status_code=401, detail="Invalid signature")
+
         try:
             # Read request body
             payload = await request.body()
@@ -140,18 +294,18 @@ class GitHubWebhook:
                 logger.error("Invalid webhook signature")
                 raise HTTPException(status_code=401, detail="Invalid signature")
             
-            # Parse payload
-            payload_data = json.loads(payload)
-            logger.info(f"Webhook payload: {json.dumps(payload_data, indent=2)}")
-            
-            # Handle different event types
-            if event_type == 'push':
-                return await self.handle_push_event(payload_data, db)
-            else:
+            # Only push events are handled, so other payloads are never parsed
+            if event_type != 'push':
                 logger.info(f"Ignoring event type: {event_type}")
                 return {"status": "ignored", "event": event_type}
+
+            # Parse payload
+            payload_data = orjson.loads(payload)
+            logger.info(f"Webhook payload: {orjson.dumps(payload_data, option=orjson.OPT_INDENT_2).decode()}")
+
+            return await self.handle_push_event(payload_data, db, client)
                 
-        except json.JSONDecodeError as e:
+        except orjson.JSONDecodeError as e:
             logger.error(f"Error decoding webhook payload: {str(e)}")
             raise HTTPException(status_code=400, detail="Invalid JSON payload")
         except Exception as e:
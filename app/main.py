@@ -1,21 +1,26 @@
 from fastapi import FastAPI, HTTPException, Depends, Request, Query, Body
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse
+from fastapi.responses import FileResponse, ORJSONResponse, Response
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import Dict, Hashable, List, Tuple
 import os
 from dotenv import load_dotenv
 from datetime import datetime, timedelta
 import httpx
 import logging
 import copy
+import asyncio
+import hashlib
+import hmac
+import orjson
+from contextlib import asynccontextmanager
 
-from .database import get_db, engine
+from .database import get_db, engine, SessionLocal
 from . import models, schemas, crud
-from .code_analyzer import CodeAnalyzer
+from .code_analyzer import CodeAnalyzer, start_lint_pool, shutdown_lint_pool
 from .github import GitHubWebhook
-from .cache import cache
-from .ml_model import code_smell_detector
+from .cache import cache, shared_cache, cache_config, invalidate_namespace
+from .ml_model import code_smell_detector, prediction_batcher
 from app.routers import aws_metrics
 
 # Set up logging
@@ -29,10 +34,49 @@ load_dotenv()
 # Create database tables
 models.Base.metadata.create_all(bind=engine)
 
+async def _retrain_periodically(interval_seconds: int):
+    """Retrain the code smell model on a schedule instead of during requests"""
+    while True:
+        await asyncio.sleep(interval_seconds)
+        try:
+            with SessionLocal() as db:
+                results = await asyncio.to_thread(code_smell_detector.train, db)
+            logger.info(f"Retrained code smell model: {results}")
+        except ValueError as e:
+            logger.info(f"Skipped code smell model retraining: {str(e)}")
+        except Exception as e:
+            logger.error(f"Error retraining code smell model: {str(e)}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One pooled client for all GitHub traffic, so webhooks and OAuth callbacks reuse connections
+    app.state.gh_client = httpx.AsyncClient(
+        base_url="https://api.github.com",
+        http2=True,
+        follow_redirects=True,
+        limits=httpx.Limits(max_keepalive_connections=20, max_connections=100),
+        headers={"Accept": "application/vnd.github.v3+json"}
+    )
+    start_lint_pool()
+    # Analytics are shared across workers through Redis when it is configured
+    await shared_cache.connect(os.getenv("REDIS_URL"))
+    retrain_task = asyncio.create_task(
+        _retrain_periodically(int(os.getenv("ML_RETRAIN_INTERVAL_SECONDS", "3600")))
+    )
+    try:
+        yield
+    finally:
+        retrain_task.cancel()
+        await app.state.gh_client.aclose()
+        shutdown_lint_pool()
+        await shared_cache.disconnect()
+
 app = FastAPI(
     title="Automated Code Quality Reviewer",
     description="An API for automated code quality analysis and review",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
 )
 
 # Configure CORS
@@ -48,39 +92,62 @@ app.add_middleware(
 code_analyzer = CodeAnalyzer()
 webhook_secret = os.getenv("GITHUB_WEBHOOK_SECRET", "")
 logger.info(f"Loaded webhook secret length: {len(webhook_secret) if webhook_secret else 0}")
-github_webhook_handler = GitHubWebhook(webhook_secret=webhook_secret)
+github_webhook_handler = GitHubWebhook(
+    webhook_secret=webhook_secret,
+    github_token=os.getenv("GITHUB_TOKEN")
+)
+
+# GitHub OAuth token exchange; the client credentials don't change while the app runs
+GITHUB_TOKEN_URL = "https://github.com/login/oauth/access_token"
+_GITHUB_TOKEN_HEADERS = {"Accept": "application/json"}
+_GITHUB_OAUTH_CLIENT = {
+    "client_id": os.getenv("GITHUB_CLIENT_ID"),
+    "client_secret": os.getenv("GITHUB_CLIENT_SECRET"),
+}
+
+# How long /analyses responses are cached; every write invalidates them
+ANALYSES_TTL_SECONDS = 60
+
+# How long analytics responses are cached, in the app and by clients
+ANALYTICS_TTL_SECONDS = 300
+
+# Local copies of Redis-backed analytics are kept briefly, so workers stay in step
+ANALYTICS_LOCAL_TTL_SECONDS = 30
+
+# Analytics computations in progress, by cache key
+_analytics_inflight: Dict[Hashable, asyncio.Task] = {}
 
 ADMIN_SECURITY_ANSWER = os.getenv("ADMIN_SECURITY_ANSWER", "mysecretanswer")
 ADMIN_UNIQUE_CODE = os.getenv("ADMIN_UNIQUE_CODE", "ADM1N-C0DE-2024")
-print(f"[DEBUG] ADMIN_SECURITY_ANSWER is: '{ADMIN_SECURITY_ANSWER}'")
+# Normalized once; compared in constant time so response times don't reveal the secrets
+_ADMIN_ANSWER_NORM = ADMIN_SECURITY_ANSWER.strip().lower().encode()
+_ADMIN_CODE_BYTES = ADMIN_UNIQUE_CODE.encode()
+
+_TRAIN_PAGE_PATH = os.path.join(os.path.dirname(__file__), "static", "train.html")
 
 app.include_router(aws_metrics.router)
 
+def get_gh_client(request: Request) -> httpx.AsyncClient:
+    """Dependency returning the shared GitHub HTTP client"""
+    return request.app.state.gh_client
+
 @app.get("/")
 async def root():
     return {"message": "Welcome to Automated Code Quality Reviewer API"}
 
 @app.get("/auth/github/callback")
-async def github_callback(code: str):
+async def github_callback(code: str, client: httpx.AsyncClient = Depends(get_gh_client)):
     """
     Handle GitHub OAuth callback
     """
     try:
         # Exchange code for access token
-        token_url = "https://github.com/login/oauth/access_token"
-        data = {
-            "client_id": os.getenv("GITHUB_CLIENT_ID"),
-            "client_secret": os.getenv("GITHUB_CLIENT_SECRET"),
-            "code": code
-        }
-        headers = {"Accept": "application/json"}
+        data = {**_GITHUB_OAUTH_CLIENT, "code": code}
+        response = await client.post(GITHUB_TOKEN_URL, data=data, headers=_GITHUB_TOKEN_HEADERS)
+        response.raise_for_status()
+        token_data = response.json()
         
-        async with httpx.AsyncClient() as client:
-            response = await client.post(token_url, data=data, headers=headers)
-            response.raise_for_status()
-            token_data = response.json()
-            
-            return {"status": "success", "access_token": token_data.get("access_token")}
+        return {"status": "success", "access_token": token_data.get("access_token")}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -96,37 +163,27 @@ async def analyze_code(
         # Analyze the code
         analysis_result = await code_analyzer.analyze(code.code)
         
-        # Create a CodeAnalysis object
-        db_analysis = schemas.CodeAnalysis(
-            code=code.code,
-            created_at=datetime.utcnow(),
-            updated_at=datetime.utcnow(),
-            pylint_score=analysis_result['pylint_score'],
-            complexity_score=analysis_result['complexity_score'],
-            maintainability_score=analysis_result['maintainability_score'],
-            security_score=analysis_result['security_score'],
-            overall_score=analysis_result['overall_score'],
-            metrics=schemas.AnalysisMetrics(**analysis_result['metrics']),
-            flake8_issues=analysis_result['flake8_issues'],
-            bandit_issues=analysis_result['bandit_issues']
-        )
-        
-        # Save to database
-        saved_analysis = crud.create_analysis(db, db_analysis)
-        
-        # Convert SQLAlchemy model to Pydantic model
-        response_model = schemas.CodeAnalysis.model_validate(saved_analysis)
-        
-        # Add ML results to the response if present
-        response = response_model.model_dump()
-        for k in ['ai_code_smell', 'ai_confidence', 'ai_suggestions']:
-            if k in analysis_result:
-                response[k] = analysis_result[k]
-        return response
+        # Save the analyzer's output directly; the database stamps created_at/updated_at
+        saved_analysis = crud.create_analysis(db, {
+            "code": code.code,
+            "pylint_score": analysis_result['pylint_score'],
+            "complexity_score": analysis_result['complexity_score'],
+            "maintainability_score": analysis_result['maintainability_score'],
+            "security_score": analysis_result['security_score'],
+            "overall_score": analysis_result['overall_score'],
+            "metrics": analysis_result['metrics'],
+            "flake8_issues": analysis_result['flake8_issues'],
+            "bandit_issues": analysis_result['bandit_issues']
+        })
+        await invalidate_namespace("analyses")
+        # Validate the saved row and serialize it in one pass instead of via jsonable_encoder
+        body = schemas.CodeAnalysis.model_validate(saved_analysis).model_dump_json()
+        return Response(content=body, media_type="application/json")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/analyses", response_model=List[schemas.CodeAnalysis])
+@app.get("/analyses", response_model=List[schemas.CodeAnalysisSummary])
+@cache_config("analyses", ttl_seconds=ANALYSES_TTL_SECONDS, response_model=List[schemas.CodeAnalysisSummary])
 async def get_analyses(
     skip: int = 0,
     limit: int = 10,
@@ -134,19 +191,12 @@ async def get_analyses(
     db: Session = Depends(get_db)
 ):
     """
-    Get list of previous code analyses, with AI tips generated for each analysis
+    Get list of previous code analyses, without their source code
     """
-    analyses = crud.get_analyses(db, skip=skip, limit=limit, repository=repository)
-    results = []
-    for analysis in analyses:
-        if hasattr(analysis, 'model_dump'):
-            analysis_dict = analysis.model_dump()
-        else:
-            analysis_dict = {c.name: getattr(analysis, c.name) for c in analysis.__table__.columns}
-        results.append(analysis_dict)
-    return results
+    return crud.get_analyses(db, skip=skip, limit=limit, repository=repository, with_code=False)
 
 @app.get("/analyses/{analysis_id}", response_model=schemas.CodeAnalysis)
+@cache_config("analyses", ttl_seconds=ANALYSES_TTL_SECONDS, response_model=schemas.CodeAnalysis)
 async def get_analysis(
     analysis_id: int,
     db: Session = Depends(get_db)
@@ -159,129 +209,155 @@ async def get_analysis(
         raise HTTPException(status_code=404, detail="Analysis not found")
     return analysis
 
+@app.get("/analyses/{analysis_id}/code", response_model=schemas.AnalysisCode)
+async def get_analysis_code(
+    analysis_id: int,
+    db: Session = Depends(get_db)
+):
+    """
+    Get the source code of a specific analysis
+    """
+    analysis = crud.get_analysis_code(db, analysis_id)
+    if analysis is None:
+        raise HTTPException(status_code=404, detail="Analysis not found")
+    return analysis
+
 @app.post("/webhook/github")
 async def handle_github_webhook(
     request: Request,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    client: httpx.AsyncClient = Depends(get_gh_client)
 ):
     """
     Handle GitHub webhook events
     """
     logger.info("Received GitHub webhook request")
-    return await github_webhook_handler.process_webhook(request, db)
+    return await github_webhook_handler.process_webhook(request, db, client)
+
+# Trend names in the analytics response and the score each one follows
+_TREND_FIELDS = (
+    ("overall", "overall_score"),
+    ("maintainability", "maintainability_score"),
+    ("security", "security_score"),
+    ("complexity", "complexity_score"),
+)
+
+_TREND_LABELS = ("down", "stable", "up")
+
+def _trend(first: float, last: float) -> str:
+    """Direction of a score between the first and last day"""
+    return _TREND_LABELS[(last > first) - (last < first) + 1]
+
+def _compute_analytics(start_date: datetime, end_date: datetime) -> bytes:
+    """Build the encoded analytics response for a date range"""
+    # Runs in a worker thread on behalf of concurrent requests, so it owns its session
+    with SessionLocal() as db:
+        # Daily averages are aggregated by the database, already sorted by date
+        analytics_data = [
+            {
+                # SQLite returns DATE() as text, PostgreSQL as a date, which orjson writes as the same text
+                "date": row.date,
+                "overall_score": row.overall_score,
+                "maintainability_score": row.maintainability_score,
+                "security_score": row.security_score,
+                "complexity_score": row.complexity_score
+            }
+            for row in crud.get_daily_analytics(db, start_date, end_date)
+        ]
+
+    # Calculate trends
+    if len(analytics_data) >= 2:
+        first = analytics_data[0]
+        last = analytics_data[-1]
+        trends = {
+            name: {"value": last[field], "trend": _trend(first[field], last[field])}
+            for name, field in _TREND_FIELDS
+        }
+    else:
+        trends = {name: {"value": 0, "trend": "stable"} for name, _ in _TREND_FIELDS}
+
+    result = {
+        "analytics": analytics_data,
+        "trends": trends
+    }
+
+    # Encoded once here so cache hits and conditional requests skip serialization
+    return orjson.dumps(result)
+
+async def _load_analytics(cache_key: Hashable, start_date: datetime, end_date: datetime) -> Tuple[bytes, str]:
+    """Get the encoded analytics and ETag from the shared cache, computing them on a miss"""
+    redis_key = ":".join(map(str, cache_key))
+    body = await shared_cache.get(redis_key)
+    if body is None:
+        body = await asyncio.to_thread(_compute_analytics, start_date, end_date)
+        await shared_cache.set(redis_key, body, ANALYTICS_TTL_SECONDS)
+
+    # With Redis as the source of truth the local copy only absorbs bursts
+    local_ttl = ANALYTICS_LOCAL_TTL_SECONDS if shared_cache.enabled else ANALYTICS_TTL_SECONDS
+    result = (body, f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"')
+    cache.set(cache_key, result, local_ttl)
+    return result
 
 @app.get("/analytics")
 async def get_analytics(
-    timeRange: str = Query("30d", description="Time range for analytics (7d, 30d, 90d, 1y)"),
-    db: Session = Depends(get_db)
+    request: Request,
+    timeRange: str = Query("30d", description="Time range for analytics (7d, 30d, 90d, 1y)")
 ):
     try:
-        # Generate cache key based on timeRange
-        cache_key = f"analytics_{timeRange}"
+        # Keyed per UTC day too, so a cached range never outlives the day it ends on
+        cache_key = ("analytics", timeRange, datetime.utcnow().date())
         
         # Check cache first
         cached_result = cache.get(cache_key)
-        if cached_result is not None:
-            return cached_result
-
-        # Calculate date range
-        end_date = datetime.utcnow()
-        if timeRange == "7d":
-            start_date = end_date - timedelta(days=7)
-        elif timeRange == "30d":
-            start_date = end_date - timedelta(days=30)
-        elif timeRange == "90d":
-            start_date = end_date - timedelta(days=90)
-        elif timeRange == "1y":
-            start_date = end_date - timedelta(days=365)
-        else:
-            raise HTTPException(status_code=400, detail="Invalid time range")
-
-        # Get analyses within date range
-        analyses = crud.get_analyses_by_date_range(db, start_date, end_date)
-        
-        # Calculate daily averages
-        daily_data = {}
-        for analysis in analyses:
-            date = analysis.created_at.date().isoformat()
-            if date not in daily_data:
-                daily_data[date] = {
-                    "overall_score": [],
-                    "maintainability_score": [],
-                    "security_score": [],
-                    "complexity_score": []
-                }
-            
-            daily_data[date]["overall_score"].append(analysis.overall_score)
-            daily_data[date]["maintainability_score"].append(analysis.maintainability_score)
-            daily_data[date]["security_score"].append(analysis.security_score)
-            daily_data[date]["complexity_score"].append(analysis.complexity_score)
-
-        # Calculate averages and format data
-        analytics_data = []
-        for date, scores in daily_data.items():
-            analytics_data.append({
-                "date": date,
-                "overall_score": sum(scores["overall_score"]) / len(scores["overall_score"]),
-                "maintainability_score": sum(scores["maintainability_score"]) / len(scores["maintainability_score"]),
-                "security_score": sum(scores["security_score"]) / len(scores["security_score"]),
-                "complexity_score": sum(scores["complexity_score"]) / len(scores["complexity_score"])
-            })
-
-        # Sort by date
-        analytics_data.sort(key=lambda x: x["date"])
-
-        # Calculate trends
-        if len(analytics_data) >= 2:
-            first = analytics_data[0]
-            last = analytics_data[-1]
-            trends = {
-                "overall": {
-                    "value": last["overall_score"],
-                    "trend": "up" if last["overall_score"] > first["overall_score"] else "down" if last["overall_score"] < first["overall_score"] else "stable"
-                },
-                "maintainability": {
-                    "value": last["maintainability_score"],
-                    "trend": "up" if last["maintainability_score"] > first["maintainability_score"] else "down" if last["maintainability_score"] < first["maintainability_score"] else "stable"
-                },
-                "security": {
-                    "value": last["security_score"],
-                    "trend": "up" if last["security_score"] > first["security_score"] else "down" if last["security_score"] < first["security_score"] else "stable"
-                },
-                "complexity": {
-                    "value": last["complexity_score"],
-                    "trend": "up" if last["complexity_score"] > first["complexity_score"] else "down" if last["complexity_score"] < first["complexity_score"] else "stable"
-                }
-            }
-        else:
-            trends = {
-                "overall": {"value": 0, "trend": "stable"},
-                "maintainability": {"value": 0, "trend": "stable"},
-                "security": {"value": 0, "trend": "stable"},
-                "complexity": {"value": 0, "trend": "stable"}
-            }
-
-        result = {
-            "analytics": analytics_data,
-            "trends": trends
-        }
-
-        # Cache the result for 5 minutes
-        cache.set(cache_key, result, 300)
-
-        return result
-
+        if cached_result is None:
+            cached_result = await _shared_analytics(cache_key, timeRange)
+        body, etag = cached_result
+
+        # Browsers and CDNs may reuse the response for as long as it stays in the cache
+        headers = {"ETag": etag, "Cache-Control": f"public, max-age={ANALYTICS_TTL_SECONDS}"}
+        if request.headers.get("If-None-Match") == etag:
+            return Response(status_code=304, headers=headers)
+        return Response(content=body, media_type="application/json", headers=headers)
+
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error getting analytics: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+async def _shared_analytics(cache_key: Hashable, timeRange: str) -> Tuple[bytes, str]:
+    """Compute analytics for a time range, joining a computation already in progress"""
+    # Calculate date range
+    end_date = datetime.utcnow()
+    if timeRange == "7d":
+        start_date = end_date - timedelta(days=7)
+    elif timeRange == "30d":
+        start_date = end_date - timedelta(days=30)
+    elif timeRange == "90d":
+        start_date = end_date - timedelta(days=90)
+    elif timeRange == "1y":
+        start_date = end_date - timedelta(days=365)
+    else:
+        raise HTTPException(status_code=400, detail="Invalid time range")
+
+    # Concurrent misses for the same range wait on one computation
+    task = _analytics_inflight.get(cache_key)
+    if task is None:
+        task = asyncio.ensure_future(_load_analytics(cache_key, start_date, end_date))
+        _analytics_inflight[cache_key] = task
+        task.add_done_callback(lambda _: _analytics_inflight.pop(cache_key, None))
+
+    # Shielded so a disconnecting client does not cancel it for the others
+    return await asyncio.shield(task)
+
 @app.post("/admin/cache/clear")
 async def clear_cache():
     """
-    Clear the in-memory cache
+    Clear the in-memory cache and the shared analytics cache
     """
     try:
         cache.clear()
+        await shared_cache.delete_pattern("analytics:*")
         return {"message": "Cache cleared successfully"}
     except Exception as e:
         logger.error(f"Error clearing cache: {str(e)}")
@@ -313,21 +389,19 @@ async def update_analysis_label(
     analysis.label = label_update.label
     db.commit()
     db.refresh(analysis)
+    await invalidate_namespace("analyses")
     return {"id": analysis.id, "label": analysis.label}
 
 @app.post("/analyze/user")
-async def analyze_user_code(
-    code: schemas.CodeSubmission,
-    db: Session = Depends(get_db)
-):
+async def analyze_user_code(code: schemas.CodeSubmission):
     try:
-        analysis_result = await CodeAnalyzer().analyze(code.code)
+        # analyze() returns the cached dict itself, so copy before adding request-specific keys
+        analysis_result = copy.copy(await CodeAnalyzer().analyze(code.code))
         analysis_result['code'] = code.code
 
-        # Correct import for the ML model
+        # Prediction is CPU-bound, so it runs off the event loop, batched with concurrent requests
         try:
-            from .ml_model import code_smell_detector
-            ml_prediction = code_smell_detector.predict(code.code)
+            ml_prediction = await prediction_batcher.predict(code.code)
             analysis_result['ml_prediction'] = ml_prediction
         except Exception as e:
             analysis_result['ml_prediction'] = {
@@ -338,18 +412,11 @@ async def analyze_user_code(
 
         # Add ChatGPT AI tips to the response
         try:
-            ai_tips = CodeAnalyzer().get_gpt_suggestions(analysis_result['metrics'], code.code)
+            ai_tips = await CodeAnalyzer().get_gpt_suggestions(analysis_result['metrics'], code.code)
             analysis_result['ai_tips'] = ai_tips
         except Exception as e:
             analysis_result['ai_tips'] = f"AI tips unavailable: {str(e)}"
 
-        # Optionally: train the model (after prediction)
-        try:
-            from .ml_model import code_smell_detector
-            code_smell_detector.train(db)
-        except Exception:
-            pass
-
         return analysis_result
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -360,7 +427,7 @@ async def train_ml_model(db: Session = Depends(get_db)):
     Train the ML model using labeled data
     """
     try:
-        results = code_smell_detector.train(db)
+        results = await asyncio.to_thread(code_smell_detector.train, db)
         return {
             "message": "Model trained successfully",
             "results": results
@@ -370,104 +437,27 @@ async def train_ml_model(db: Session = Depends(get_db)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/admin/ml/train", response_class=HTMLResponse)
+@app.get("/admin/ml/train", response_class=FileResponse)
 async def train_ml_model_page():
     """
     Serve a simple HTML page with a button to train the ML model
     """
-    return """
-    <!DOCTYPE html>
-    <html>
-        <head>
-            <title>Train ML Model</title>
-            <style>
-                body {
-                    font-family: Arial, sans-serif;
-                    max-width: 800px;
-                    margin: 0 auto;
-                    padding: 20px;
-                }
-                .container {
-                    text-align: center;
-                    margin-top: 50px;
-                }
-                button {
-                    padding: 10px 20px;
-                    font-size: 16px;
-                    background-color: #2563eb;
-                    color: white;
-                    border: none;
-                    border-radius: 4px;
-                    cursor: pointer;
-                }
-                button:hover {
-                    background-color: #1d4ed8;
-                }
-                #result {
-                    margin-top: 20px;
-                    padding: 10px;
-                    border-radius: 4px;
-                }
-                .success {
-                    background-color: #dcfce7;
-                    color: #166534;
-                }
-                .error {
-                    background-color: #fee2e2;
-                    color: #991b1b;
-                }
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <h1>Train ML Model</h1>
-                <p>Click the button below to train the ML model using labeled data.</p>
-                <button onclick="trainModel()">Train Model</button>
-                <div id="result"></div>
-            </div>
-            <script>
-                async function trainModel() {
-                    const resultDiv = document.getElementById('result');
-                    resultDiv.innerHTML = 'Training model...';
-                    resultDiv.className = '';
-                    
-                    try {
-                        const response = await fetch('/admin/ml/train', {
-                            method: 'POST'
-                        });
-                        const data = await response.json();
-                        
-                        if (response.ok) {
-                            resultDiv.innerHTML = `
-                                <strong>Success!</strong><br>
-                                Training Accuracy: ${(data.results.train_accuracy * 100).toFixed(1)}%<br>
-                                Test Accuracy: ${(data.results.test_accuracy * 100).toFixed(1)}%<br>
-                                Samples Used: ${data.results.samples_used}
-                            `;
-                            resultDiv.className = 'success';
-                        } else {
-                            throw new Error(data.detail || 'Failed to train model');
-                        }
-                    } catch (error) {
-                        resultDiv.innerHTML = `<strong>Error:</strong> ${error.message}`;
-                        resultDiv.className = 'error';
-                    }
-                }
-            </script>
-        </body>
-    </html>
-    """
+    return FileResponse(
+        _TRAIN_PAGE_PATH,
+        media_type="text/html",
+        headers={"Cache-Control": "public, max-age=3600"},
+    )
 
 @app.post("/api/admin/auth")
 async def admin_authenticate(answer: str = Body(..., embed=True)):
-    if answer.strip().lower() == ADMIN_SECURITY_ANSWER.strip().lower():
+    if hmac.compare_digest(answer.strip().lower().encode(), _ADMIN_ANSWER_NORM):
         return {"code": ADMIN_UNIQUE_CODE}
     else:
         raise HTTPException(status_code=401, detail="Incorrect answer.")
 
 @app.post("/api/admin/verify")
 async def admin_verify(code: str = Body(..., embed=True)):
-    if code == ADMIN_UNIQUE_CODE:
+    if hmac.compare_digest(code.encode(), _ADMIN_CODE_BYTES):
         return {"admin": True}
     else:
         return {"admin": False} 
\ No newline at end of file
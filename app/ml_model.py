@@ -1,90 +1,250 @@
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.ensemble import HistGradientBoostingClassifier
+from sklearn.feature_extraction.text import HashingVectorizer, TfidfTransformer
 from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import FunctionTransformer
 from sklearn.model_selection import train_test_split
 import numpy as np
+import asyncio
 import joblib
 import os
-from typing import List, Dict, Any, Tuple
+import json
+import hashlib
+import tempfile
+import threading
+from typing import List, Dict, Any, Optional, Set, Tuple
+from sqlalchemy import func, select
 from sqlalchemy.orm import Session
 from . import models
 
+# Bumped whenever _new_pipeline changes; saved models of another version are not loaded
+_PIPELINE_VERSION = "hgb-2"
+
+
+def _densify(X):
+    """HistGradientBoosting on scikit-learn 1.3 only accepts dense input"""
+    return X.toarray()
+
+
+def _new_pipeline():
+    """Untrained pipeline of the current _PIPELINE_VERSION"""
+    return Pipeline([
+        # Hashed features need no vocabulary; 2**10 columns keeps the dense width of the
+        # previous 1000-term vocabulary
+        ('hasher', HashingVectorizer(
+            n_features=2 ** 10,
+            alternate_sign=False,
+            norm=None,
+            ngram_range=(1, 2),
+            stop_words='english',
+            dtype=np.float32
+        )),
+        ('tfidf', TfidfTransformer()),
+        ('dense', FunctionTransformer(_densify, accept_sparse=True)),
+        ('classifier', HistGradientBoostingClassifier(
+            max_iter=200,
+            max_depth=6,
+            learning_rate=0.1,
+            random_state=42
+        ))
+    ])
+
+
+def _write_json(path: str, data: Dict[str, Any]) -> None:
+    with open(path, "w") as f:
+        json.dump(data, f)
+
+
 class CodeSmellDetector:
     def __init__(self):
         self.model = None
         self.vectorizer = None
-        self.pipeline = None
+        self._pipeline = None
+        self._loaded = False
+        self._load_lock = threading.Lock()
+        # The scheduled retrain and the admin endpoint both train in worker threads
+        self._train_lock = threading.Lock()
         self.model_path = "ml_model/code_smell_detector.joblib"
-        self._load_or_create_model()
+        # Hash of the labeled rows the saved model was trained on, with its scores
+        self.meta_path = "ml_model/code_smell_detector.meta.json"
+        self._corpus_hash = None
+        self._last_results = None
+
+    @property
+    def pipeline(self):
+        """The model pipeline, loaded from disk on first use rather than at import"""
+        if not self._loaded:
+            with self._load_lock:
+                if not self._loaded:
+                    self._load_or_create_model()
+                    self._loaded = True
+        return self._pipeline
+
+    @pipeline.setter
+    def pipeline(self, pipeline):
+        self._pipeline = pipeline
+        self._loaded = True
 
     def _load_or_create_model(self):
         """Load existing model or create a new one if it doesn't exist"""
-        if os.path.exists(self.model_path):
-            self.pipeline = joblib.load(self.model_path)
+        meta = None
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path) as f:
+                meta = json.load(f)
+        # A model saved by another pipeline version is ignored, so the next training builds the current one
+        if os.path.exists(self.model_path) and meta and meta.get("pipeline_version") == _PIPELINE_VERSION:
+            # Memory-mapped, so worker processes share the model's arrays through the page cache
+            self._pipeline = joblib.load(self.model_path, mmap_mode="r")
+            self._corpus_hash = meta["corpus_hash"]
+            self._last_results = meta["results"]
         else:
-            self.pipeline = Pipeline([
-                ('tfidf', TfidfVectorizer(
-                    max_features=1000,
-                    ngram_range=(1, 2),
-                    stop_words='english'
-                )),
-                ('classifier', RandomForestClassifier(
-                    n_estimators=100,
-                    max_depth=10,
-                    random_state=42
-                ))
-            ])
+            self._pipeline = _new_pipeline()
 
     def train(self, db: Session) -> Dict[str, float]:
-        """Train the model using labeled data from the database"""
-        # Get all labeled analyses
-        labeled_analyses = db.query(models.CodeAnalysis).filter(
-            models.CodeAnalysis.label.isnot(None)
-        ).all()
+        """Train the model using labeled data from the database, one training at a time"""
+        # A training that waited here finds the corpus already trained on and returns its results
+        with self._train_lock:
+            return self._train(db)
 
-        if len(labeled_analyses) < 10:
+    def _train(self, db: Session) -> Dict[str, float]:
+        labeled = models.CodeAnalysis.label.isnot(None)
+        # Counted on the partial index first, so too little data costs no row transfer
+        count = db.scalar(select(func.count()).select_from(models.CodeAnalysis).where(labeled))
+        if count < 10:
             raise ValueError("Not enough labeled data for training. Need at least 10 samples.")
 
-        # Prepare data
-        X = [analysis.code for analysis in labeled_analyses]
-        y = [analysis.label for analysis in labeled_analyses]
+        # Stream only the two columns used, without building ORM objects; ordered so the
+        # split, and so the trained model, depends only on the labeled rows
+        stmt = select(models.CodeAnalysis.code, models.CodeAnalysis.label).where(
+            labeled
+        ).order_by(models.CodeAnalysis.id)
+        X, y = [], []
+        digest = hashlib.sha256(_PIPELINE_VERSION.encode("utf-8"))
+        for code, label in db.execute(stmt.execution_options(yield_per=1000)):
+            X.append(code)
+            y.append(label)
+            encoded = (code or "").encode("utf-8")
+            digest.update(f"{label}:{len(encoded)}:".encode("utf-8"))
+            digest.update(encoded)
+        corpus_hash = digest.hexdigest()
+
+        # Loading the saved model also loads the hash of the corpus it was trained on
+        self.pipeline
+        # The split and the classifier are seeded, so an unchanged corpus yields the same model
+        if corpus_hash == self._corpus_hash and self._last_results is not None:
+            return self._last_results
 
         # Split data
         X_train, X_test, y_train, y_test = train_test_split(
             X, y, test_size=0.2, random_state=42
         )
 
-        # Train model
-        self.pipeline.fit(X_train, y_train)
+        # Train a new pipeline so predictions running in other threads keep the current model
+        pipeline = _new_pipeline()
+        pipeline.fit(X_train, y_train)
 
         # Evaluate
-        train_score = self.pipeline.score(X_train, y_train)
-        test_score = self.pipeline.score(X_test, y_test)
+        train_score = pipeline.score(X_train, y_train)
+        test_score = pipeline.score(X_test, y_test)
 
-        # Save model
-        os.makedirs(os.path.dirname(self.model_path), exist_ok=True)
-        joblib.dump(self.pipeline, self.model_path)
-
-        return {
+        results = {
             "train_accuracy": train_score,
             "test_accuracy": test_score,
-            "samples_used": len(labeled_analyses)
+            "samples_used": len(X)
         }
 
+        # Save model, then its metadata; both replace the old file rather than overwrite it, so
+        # pipelines still memory-mapping the old model keep a valid file
+        self._replace_file(self.model_path, lambda path: joblib.dump(pipeline, path))
+        self.pipeline = pipeline
+        meta = {"pipeline_version": _PIPELINE_VERSION, "corpus_hash": corpus_hash, "results": results}
+        self._replace_file(self.meta_path, lambda path: _write_json(path, meta))
+        self._corpus_hash = corpus_hash
+        self._last_results = results
+        return results
+
+    def _replace_file(self, path: str, write) -> None:
+        """Write a file through a temporary file in the same directory and move it into place"""
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        os.close(fd)
+        try:
+            write(tmp_path)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
     def predict(self, code: str) -> Dict[str, Any]:
         """Predict if the code has a code smell"""
-        if not self.pipeline:
+        return self.predict_many([code])[0]
+
+    def predict_many(self, codes: List[str]) -> List[Dict[str, Any]]:
+        """Predict code smells for several snippets in one pass through the pipeline"""
+        pipeline = self.pipeline
+        if not pipeline:
             raise ValueError("Model not trained yet")
 
-        # Get prediction and probability
-        prediction = self.pipeline.predict([code])[0]
-        probabilities = self.pipeline.predict_proba([code])[0]
-        confidence = probabilities[prediction]
+        # The predicted class is the most probable one, so one predict_proba call gives both
+        probabilities = pipeline.predict_proba(codes)
+        best = probabilities.argmax(axis=1)
+        predictions = pipeline.classes_[best]
+        confidences = probabilities[np.arange(len(codes)), best]
 
-        return {
-            "prediction": int(prediction),  # 0 for clean, 1 for code smell
-            "confidence": float(confidence)
-        }
+        return [
+            {
+                "prediction": int(prediction),  # 0 for clean, 1 for code smell
+                "confidence": float(confidence)
+            }
+            for prediction, confidence in zip(predictions, confidences)
+        ]
+
+class PredictionBatcher:
+    """Coalesce concurrent predictions into one predict_many call run in a worker thread"""
+
+    def __init__(self, detector: CodeSmellDetector, max_delay: float = 0.005, max_batch: int = 64):
+        self.detector = detector
+        self.max_delay = max_delay
+        self.max_batch = max_batch
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        # The loop holds tasks only weakly, so running batches are kept here until they finish
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def predict(self, code: str) -> Dict[str, Any]:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((code, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.max_delay, self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: List[Tuple[str, asyncio.Future]]) -> None:
+        try:
+            results = await asyncio.to_thread(self.detector.predict_many, [code for code, _ in batch])
+        except Exception as e:
+            results = [e] * len(batch)
+        for (_, future), result in zip(batch, results):
+            # Callers that gave up (e.g. disconnected) have cancelled their future
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
 
 # Create a singleton instance
-code_smell_detector = CodeSmellDetector() 
\ No newline at end of file
+code_smell_detector = CodeSmellDetector()
+prediction_batcher = PredictionBatcher(code_smell_detector) 
\ No newline at end of file
@@ -1,14 +1,28 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, JSON
-from sqlalchemy.sql import func
+from sqlalchemy import Column, Integer, String, Float, DateTime, JSON, Index
+from sqlalchemy.sql import func, text
 from .database import Base
 
 class CodeAnalysis(Base):
     __tablename__ = "code_analyses"
+    # Fetch server-generated columns in the INSERT itself instead of a follow-up SELECT
+    __mapper_args__ = {"eager_defaults": True}
+    # Date-range analytics and per-repository listings filter and sort on created_at
+    __table_args__ = (
+        Index("ix_analysis_created_at", "created_at"),
+        Index("ix_analysis_repo_created", "repository", "created_at"),
+        # Only labeled rows are used for training, and they are a small fraction of the table
+        Index(
+            "ix_analysis_labeled",
+            "label",
+            postgresql_where=text("label IS NOT NULL"),
+            sqlite_where=text("label IS NOT NULL"),
+        ),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     code = Column(String)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
     
     # Repository information
     repository = Column(String, index=True)
@@ -28,4 +42,13 @@ class CodeAnalysis(Base):
     metrics = Column(JSON)
     flake8_issues = Column(JSON)
     bandit_issues = Column(JSON)
-    label = Column(Integer, nullable=True)  # 0=clean, 1=smell 
\ No newline at end of file
+    label = Column(Integer, nullable=True)  # 0=clean, 1=smell
+
+class BlobCache(Base):
+    """Last fetched contents of a repository file, keyed for conditional GETs"""
+    __tablename__ = "blob_cache"
+
+    repository = Column(String, primary_key=True)
+    path = Column(String, primary_key=True)
+    etag = Column(String, nullable=False)
+    content = Column(String)
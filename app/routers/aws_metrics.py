@@ -1,46 +1,97 @@
 from fastapi import APIRouter
 import boto3
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from ..cache import cache
 
 REGION = 'us-east-1'  # Set this to your AWS region
 
 router = APIRouter()
 
+# Clients are thread-safe and reused across requests
+_ec2 = boto3.client('ec2', region_name=REGION)
+_eks = boto3.client('eks', region_name=REGION)
+_cloudwatch = boto3.client('cloudwatch', region_name=REGION)
+# Cost Explorer is only served from us-east-1
+_ce = boto3.client('ce', region_name='us-east-1')
+
+# How long a day's Cost Explorer figure is reused; the key also changes with the date
+BILLING_TTL_SECONDS = 24 * 60 * 60
+
+# GetMetricData accepts at most this many queries per request
+_MAX_METRIC_QUERIES = 500
+
+# Concurrent DescribeCluster requests per call
+_MAX_DESCRIBE_WORKERS = 8
+
+def _average_cpu(instance_ids, start_time, end_time):
+    """Average hourly CPU utilization per instance, fetched with batched GetMetricData calls"""
+    averages = {}
+    paginator = _cloudwatch.get_paginator('get_metric_data')
+    for offset in range(0, len(instance_ids), _MAX_METRIC_QUERIES):
+        chunk = instance_ids[offset:offset + _MAX_METRIC_QUERIES]
+        queries = [
+            {
+                'Id': f'm{offset + i}',
+                'MetricStat': {
+                    'Metric': {
+                        'Namespace': 'AWS/EC2',
+                        'MetricName': 'CPUUtilization',
+                        'Dimensions': [{'Name': 'InstanceId', 'Value': instance_id}]
+                    },
+                    'Period': 3600,
+                    'Stat': 'Average'
+                }
+            }
+            for i, instance_id in enumerate(chunk)
+        ]
+        values = {}
+        for page in paginator.paginate(MetricDataQueries=queries, StartTime=start_time, EndTime=end_time):
+            for result in page['MetricDataResults']:
+                values.setdefault(result['Id'], []).extend(result['Values'])
+        for i, instance_id in enumerate(chunk):
+            datapoints = values.get(f'm{offset + i}')
+            averages[instance_id] = round(sum(datapoints) / len(datapoints), 2) if datapoints else 0.0
+    return averages
+
 @router.get("/api/aws-metrics")
 def get_aws_metrics():
-    ec2 = boto3.client('ec2', region_name=REGION)
-    eks = boto3.client('eks', region_name=REGION)
-    cloudwatch = boto3.client('cloudwatch', region_name=REGION)
     # EC2 Instances
+    ec2_instances = [
+        instance
+        for page in _ec2.get_paginator('describe_instances').paginate()
+        for reservation in page['Reservations']
+        for instance in reservation['Instances']
+    ]
+    # Get average CPU utilization for the last 24 hours
+    end_time = datetime.utcnow()
+    start_time = end_time.replace(hour=0, minute=0, second=0, microsecond=0)
+    cpu_by_instance = _average_cpu([instance.get("InstanceId") for instance in ec2_instances], start_time, end_time)
     instances = []
-    for reservation in ec2.describe_instances()['Reservations']:
-        for instance in reservation['Instances']:
-            instance_id = instance.get("InstanceId")
-            # Get average CPU utilization for the last 24 hours
-            cpu = cloudwatch.get_metric_statistics(
-                Namespace='AWS/EC2',
-                MetricName='CPUUtilization',
-                Dimensions=[{'Name': 'InstanceId', 'Value': instance_id}],
-                StartTime=datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0),
-                EndTime=datetime.utcnow(),
-                Period=3600,
-                Statistics=['Average']
-            )
-            datapoints = cpu.get('Datapoints', [])
-            avg_cpu = round(sum([d['Average'] for d in datapoints])/len(datapoints), 2) if datapoints else 0.0
-            instances.append({
-                "id": instance_id,
-                "type": instance.get("InstanceType"),
-                "state": instance.get("State", {}).get("Name"),
-                "public_ip": instance.get("PublicIpAddress"),
-                "launch_time": str(instance.get("LaunchTime")),
-                "cpu_utilization": avg_cpu
-            })
+    for instance in ec2_instances:
+        instance_id = instance.get("InstanceId")
+        instances.append({
+            "id": instance_id,
+            "type": instance.get("InstanceType"),
+            "state": instance.get("State", {}).get("Name"),
+            "public_ip": instance.get("PublicIpAddress"),
+            "launch_time": str(instance.get("LaunchTime")),
+            "cpu_utilization": cpu_by_instance[instance_id]
+        })
     # EKS Clusters
-    eks_clusters = eks.list_clusters()['clusters']
-    eks_details = [eks.describe_cluster(name=cluster)['cluster'] for cluster in eks_clusters]
+    eks_clusters = [
+        cluster
+        for page in _eks.get_paginator('list_clusters').paginate()
+        for cluster in page['clusters']
+    ]
+    # One request per cluster, so they are issued side by side
+    with ThreadPoolExecutor(max_workers=min(_MAX_DESCRIBE_WORKERS, len(eks_clusters) or 1)) as pool:
+        eks_details = [
+            response['cluster']
+            for response in pool.map(lambda cluster: _eks.describe_cluster(name=cluster), eks_clusters)
+        ]
     # VPCs
-    vpcs = ec2.describe_vpcs()['Vpcs']
+    vpcs = _ec2.describe_vpcs()['Vpcs']
     vpc_list = [{"id": vpc.get("VpcId"), "cidr": vpc.get("CidrBlock"), "state": vpc.get("State")} for vpc in vpcs]
     return {
         "ec2_instances": instances,
@@ -50,14 +101,19 @@ def get_aws_metrics():
 
 @router.get("/api/aws-billing")
 def get_aws_billing():
-    ce = boto3.client('ce', region_name='us-east-1')
     now = datetime.utcnow()
     start = now.replace(day=1).strftime('%Y-%m-%d')
     end = now.strftime('%Y-%m-%d')
-    response = ce.get_cost_and_usage(
-        TimePeriod={'Start': start, 'End': end},
-        Granularity='MONTHLY',
-        Metrics=['UnblendedCost']
-    )
-    cost = response['ResultsByTime'][0]['Total']['UnblendedCost']['Amount']
-    return {"month": now.strftime('%B %Y'), "cost": cost} 
\ No newline at end of file
+    # Cost Explorer data only changes daily, so one lookup per day is enough
+    cache_key = ("aws-billing", end)
+    billing = cache.get(cache_key)
+    if billing is None:
+        response = _ce.get_cost_and_usage(
+            TimePeriod={'Start': start, 'End': end},
+            Granularity='MONTHLY',
+            Metrics=['UnblendedCost']
+        )
+        cost = response['ResultsByTime'][0]['Total']['UnblendedCost']['Amount']
+        billing = {"month": now.strftime('%B %Y'), "cost": cost}
+        cache.set(cache_key, billing, ttl_seconds=BILLING_TTL_SECONDS)
+    return billing 
\ No newline at end of file
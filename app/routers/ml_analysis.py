@@ -1,6 +1,6 @@
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 from ..ml_service.code_analyzer import CodeAnalyzer
 
 router = APIRouter()
@@ -8,6 +8,7 @@ code_analyzer = CodeAnalyzer()
 
 class CodeAnalysisRequest(BaseModel):
     code: str
+    language: Optional[str] = None  # Detected from the code when omitted
 
 class CodeAnalysisResponse(BaseModel):
     code_smells: list
@@ -17,7 +18,7 @@ class CodeAnalysisResponse(BaseModel):
 @router.post("/analyze", response_model=CodeAnalysisResponse)
 async def analyze_code(request: CodeAnalysisRequest) -> Dict[str, Any]:
     try:
-        analysis_result = code_analyzer.analyze_code(request.code)
+        analysis_result = code_analyzer.analyze_code(request.code, request.language)
         return analysis_result
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
@@ -33,9 +33,9 @@ class AnalysisMetrics(BaseModel):
     pylint_score: float
     test_coverage: Optional[float] = None
 
-class CodeAnalysis(BaseModel):
+class CodeAnalysisSummary(BaseModel):
+    """A stored analysis without its source code, for list views"""
     id: Optional[int] = None
-    code: str
     created_at: datetime
     updated_at: datetime
     
@@ -62,5 +62,12 @@ class CodeAnalysis(BaseModel):
         "from_attributes": True
     }
 
+class CodeAnalysis(CodeAnalysisSummary):
+    code: str
+
+class AnalysisCode(BaseModel):
+    id: int
+    code: Optional[str] = None
+
 class LabelUpdate(BaseModel):
     label: int 
\ No newline at end of file
@@ -1,3 +1,5 @@
+import hashlib
+import os
 import joblib
 import numpy as np
 from transformers import AutoTokenizer, AutoModel
@@ -11,6 +13,9 @@ from sklearn.model_selection import train_test_split
 from sklearn.metrics import classification_report
 
 MODEL_PATH = 'code_smell_classifier.pkl'
+EMBEDDINGS_CACHE_PATH = 'embeddings_cache.npz'
+ENCODER_NAME = 'microsoft/codebert-base'
+MAX_TOKENS = 256
 BATCH_SIZE = 8
 
 # Connect to DB
@@ -27,23 +32,56 @@ if not codes or not labels:
     raise ValueError('No labeled data found in the database. Please label some code analyses first.')
 
 # Load CodeBERT
-tokenizer = AutoTokenizer.from_pretrained('microsoft/codebert-base')
-model = AutoModel.from_pretrained('microsoft/codebert-base')
+device = 'cuda' if torch.cuda.is_available() else 'cpu'
+tokenizer = AutoTokenizer.from_pretrained(ENCODER_NAME)
+model = AutoModel.from_pretrained(ENCODER_NAME).to(device)
 model.eval()
 
-def get_embedding(code):
-    inputs = tokenizer(code, return_tensors='pt', truncation=True, max_length=256)
-    with torch.no_grad():
-        outputs = model(**inputs)
-        return outputs.last_hidden_state.mean(dim=1).squeeze().numpy()
+def get_embeddings(batch_codes):
+    """Mean-pooled CodeBERT embeddings for a batch of snippets in one forward pass"""
+    inputs = tokenizer(batch_codes, return_tensors='pt', truncation=True, max_length=MAX_TOKENS, padding=True).to(device)
+    # Half precision only on the GPU; CPU autocast does not support float16
+    with torch.inference_mode(), torch.autocast(device_type=device, dtype=torch.float16, enabled=device == 'cuda'):
+        hidden = model(**inputs).last_hidden_state
+    # Average over real tokens only, so padding does not change a snippet's embedding
+    mask = inputs['attention_mask'].unsqueeze(-1).to(hidden.dtype)
+    pooled = (hidden * mask).sum(dim=1) / mask.sum(dim=1)
+    return pooled.float().cpu().numpy()
 
-embeddings = []
-for i in range(0, len(codes), BATCH_SIZE):
-    batch_codes = codes[i:i+BATCH_SIZE]
-    batch_embeds = [get_embedding(code) for code in batch_codes]
-    embeddings.extend(batch_embeds)
+def code_hash(code):
+    """64-bit key of a snippet's embedding; it changes with the encoder and truncation length"""
+    digest = hashlib.blake2b(f"{ENCODER_NAME}:{MAX_TOKENS}:{code}".encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'little')
+
+# Embeddings from earlier runs are reused, so only snippets new since then go through the model
+hashes = np.array([code_hash(code) for code in codes], dtype=np.uint64)
+X = np.empty((len(codes), model.config.hidden_size), dtype=np.float32)
+missing = list(range(len(codes)))
+if os.path.exists(EMBEDDINGS_CACHE_PATH):
+    with np.load(EMBEDDINGS_CACHE_PATH) as cached:
+        cached_rows = {h: row for row, h in enumerate(cached['hashes'].tolist())}
+        cached_vecs = cached['vecs']
+    missing = []
+    for i, h in enumerate(hashes.tolist()):
+        row = cached_rows.get(h)
+        if row is None:
+            missing.append(i)
+        else:
+            X[i] = cached_vecs[row]
+print(f"Embedding {len(missing)} of {len(codes)} snippets")
+
+# Batches of similar length pad less, so snippets are embedded shortest first and put back in order
+order = sorted(missing, key=lambda i: len(codes[i]))
+for i in range(0, len(order), BATCH_SIZE):
+    batch_order = order[i:i+BATCH_SIZE]
+    X[batch_order] = get_embeddings([codes[j] for j in batch_order])
+
+# Written to a temporary file first, so an interrupted run never leaves a truncated cache
+tmp_path = EMBEDDINGS_CACHE_PATH + '.tmp'
+with open(tmp_path, 'wb') as f:
+    np.savez(f, hashes=hashes, vecs=X)
+os.replace(tmp_path, EMBEDDINGS_CACHE_PATH)
 
-X = np.array(embeddings)
 y = np.array(labels)
 
 X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
@@ -51,5 +89,5 @@ clf = RandomForestClassifier(n_estimators=100, random_state=42)
 clf.fit(X_train, y_train)
 y_pred = clf.predict(X_test)
 print(classification_report(y_test, y_pred))
-joblib.dump(clf, MODEL_PATH)
+joblib.dump(clf, MODEL_PATH, compress=3)
 print(f"Model saved to {MODEL_PATH}") 
\ No newline at end of file
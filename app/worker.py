@@ -3,7 +3,8 @@ import os
 from dotenv import load_dotenv
 import tempfile
 import subprocess
-import json
+from concurrent.futures import ThreadPoolExecutor
+import orjson
 from typing import Dict, List
 import git
 from . import crud
@@ -23,10 +24,12 @@ def run_pylint(code_path: str) -> Dict:
     try:
         result = subprocess.run(
             ["pylint", "--output-format=json", code_path],
-            capture_output=True,
-            text=True
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL
         )
-        return json.loads(result.stdout)
+        # stderr only carries progress output, so it is discarded rather than buffered;
+        # orjson parses the raw stdout bytes directly, so nothing is decoded to str
+        return orjson.loads(result.stdout)
     except Exception as e:
         return {"error": str(e)}
 
@@ -35,10 +38,10 @@ def run_flake8(code_path: str) -> Dict:
     try:
         result = subprocess.run(
             ["flake8", "--format=json", code_path],
-            capture_output=True,
-            text=True
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL
         )
-        return json.loads(result.stdout)
+        return orjson.loads(result.stdout)
     except Exception as e:
         return {"error": str(e)}
 
@@ -47,10 +50,10 @@ def run_bandit(code_path: str) -> Dict:
     try:
         result = subprocess.run(
             ["bandit", "-f", "json", "-r", code_path],
-            capture_output=True,
-            text=True
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL
         )
-        return json.loads(result.stdout)
+        return orjson.loads(result.stdout)
     except Exception as e:
         return {"error": str(e)}
 
@@ -80,9 +83,17 @@ def analyze_code_task(analysis_id: int, source: str):
         
         with tempfile.TemporaryDirectory() as temp_dir:
             if source.startswith(("http://", "https://")):
-                # Clone repository
+                # Clone only the tip of the default branch; the tools never look at history.
+                # Credential prompts fail immediately instead of hanging the worker.
                 repo_path = os.path.join(temp_dir, "repo")
-                git.Repo.clone_from(source, repo_path)
+                git.Repo.clone_from(
+                    source,
+                    repo_path,
+                    env={"GIT_TERMINAL_PROMPT": "0"},
+                    depth=1,
+                    single_branch=True,
+                    no_tags=True
+                )
                 code_path = repo_path
             else:
                 # Write code to temporary file
@@ -90,12 +101,17 @@ def analyze_code_task(analysis_id: int, source: str):
                 with open(code_path, "w") as f:
                     f.write(source)
             
-            # Run analysis tools
-            results = {
-                "pylint_results": run_pylint(code_path),
-                "flake8_results": run_flake8(code_path),
-                "bandit_results": run_bandit(code_path)
-            }
+            # Run analysis tools; each is its own process, so they run side by side
+            # and the threads only wait on them
+            with ThreadPoolExecutor(max_workers=3) as pool:
+                pylint_future = pool.submit(run_pylint, code_path)
+                flake8_future = pool.submit(run_flake8, code_path)
+                bandit_future = pool.submit(run_bandit, code_path)
+                results = {
+                    "pylint_results": pylint_future.result(),
+                    "flake8_results": flake8_future.result(),
+                    "bandit_results": bandit_future.result()
+                }
             
             # Calculate overall score
             overall_score = calculate_overall_score(results)
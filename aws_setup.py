@@ -1,18 +1,105 @@
+import argparse
 import boto3
 import json
 import os
-from botocore.exceptions import ClientError
+from botocore.config import Config
+from botocore.exceptions import ClientError, WaiterError
+from botocore.waiter import WaiterModel, create_waiter_with_client
+import functools
 import getpass
+import hashlib
 import time
+from concurrent.futures import ThreadPoolExecutor
 
-def configure_aws_credentials():
-    """Configure AWS credentials"""
+_MAX_SETUP_WORKERS = 6
+
+# Every client retries throttled calls, which long setup runs hit while polling
+_CLIENT_CONFIG = Config(tcp_keepalive=True, retries={'max_attempts': 10, 'mode': 'adaptive'})
+
+# subnet_available has no NotFound retry, so a DescribeSubnets that does not see the
+# just-created subnets yet would end the wait at once
+_SUBNET_WAITERS = WaiterModel({
+    'version': 2,
+    'waiters': {
+        'SubnetsAvailable': {
+            'operation': 'DescribeSubnets',
+            'delay': 5,
+            'maxAttempts': 60,
+            'acceptors': [
+                {'matcher': 'pathAll', 'argument': 'Subnets[].State', 'expected': 'available', 'state': 'success'},
+                {'matcher': 'error', 'expected': 'InvalidSubnetID.NotFound', 'state': 'retry'}
+            ]
+        }
+    }
+})
+
+@functools.lru_cache(maxsize=None)
+def _client(session, service_name):
+    """One client per service and session, so each service model is loaded only once"""
+    return session.client(service_name, config=_CLIENT_CONFIG)
+
+_VPC_NAME = 'code-reviewer-vpc'
+_SECURITY_GROUP_NAME = 'code-reviewer-sg'
+_DB_SUBNET_GROUP_NAME = 'code-reviewer-subnet-group'
+_DB_INSTANCE_ID = 'code-reviewer-db'
+# An RDS subnet group needs subnets in at least two availability zones
+_SUBNET_COUNT = 2
+
+_IDENTITY_CACHE_PATH = os.path.expanduser('~/.aws/code-reviewer-cache.json')
+_IDENTITY_TTL_SECONDS = 15 * 60
+
+def _credentials_key(access_key, secret_key):
+    """Cache key for a key pair; the secret is included so a mistyped one is never reported valid"""
+    return hashlib.sha256(f"{access_key}:{secret_key}".encode()).hexdigest()
+
+def _read_identity_cache():
+    """Unexpired validations by credentials key; a missing or malformed file counts as empty"""
+    try:
+        with open(_IDENTITY_CACHE_PATH) as f:
+            entries = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(entries, dict):
+        return {}
+    now = time.time()
+    return {
+        key: entry for key, entry in entries.items()
+        if isinstance(entry, dict) and now - entry.get('validated_at', 0) < _IDENTITY_TTL_SECONDS
+    }
+
+def _load_cached_identity(key):
+    """Account validated for these credentials within the TTL, if any"""
+    entry = _read_identity_cache().get(key)
+    return entry.get('account') if entry else None
+
+def _store_cached_identity(key, account):
+    """Remember a successful validation so re-runs can skip the STS call"""
+    entries = _read_identity_cache()
+    entries[key] = {'account': account, 'validated_at': time.time()}
+    try:
+        os.makedirs(os.path.dirname(_IDENTITY_CACHE_PATH), exist_ok=True)
+        with open(_IDENTITY_CACHE_PATH, 'w') as f:
+            json.dump(entries, f)
+    except OSError:
+        pass
+
+def parse_args():
+    """Command-line options; anything not given here or in the environment is prompted for"""
+    parser = argparse.ArgumentParser(description="Set up AWS infrastructure for Code Reviewer")
+    parser.add_argument('--aws-access-key-id', default=os.environ.get('AWS_ACCESS_KEY_ID'))
+    parser.add_argument('--aws-secret-access-key', default=os.environ.get('AWS_SECRET_ACCESS_KEY'))
+    parser.add_argument('--region', default=os.environ.get('AWS_DEFAULT_REGION'))
+    parser.add_argument('--rds-password', default=os.environ.get('RDS_PASSWORD'))
+    return parser.parse_args()
+
+def configure_aws_credentials(args):
+    """Configure AWS credentials and return a session for them"""
     print("\nAWS Credentials Setup")
     print("=====================")
     
-    aws_access_key = getpass.getpass("AWS Access Key ID: ").strip()
-    aws_secret_key = getpass.getpass("AWS Secret Access Key: ").strip()
-    aws_region = input("AWS Region (default: us-east-1): ").strip() or "us-east-1"
+    aws_access_key = (args.aws_access_key_id or getpass.getpass("AWS Access Key ID: ")).strip()
+    aws_secret_key = (args.aws_secret_access_key or getpass.getpass("AWS Secret Access Key: ")).strip()
+    aws_region = args.region or input("AWS Region (default: us-east-1): ").strip() or "us-east-1"
     
     if not aws_access_key or not aws_secret_key:
         print("\nError: AWS Access Key ID and Secret Access Key are required!")
@@ -22,153 +109,238 @@ def configure_aws_credentials():
     os.environ['AWS_SECRET_ACCESS_KEY'] = aws_secret_key
     os.environ['AWS_DEFAULT_REGION'] = aws_region
     
+    # Credentials are resolved once, and every client below is created from this session
+    session = boto3.Session(
+        aws_access_key_id=aws_access_key,
+        aws_secret_access_key=aws_secret_key,
+        region_name=aws_region
+    )
+    
+    credentials_key = _credentials_key(aws_access_key, aws_secret_key)
+    account = _load_cached_identity(credentials_key)
+    if account:
+        print(f"\nCredentials validated recently, skipping check.")
+        print(f"AWS Account: {account}")
+        return session
+    
     try:
-        sts = boto3.client('sts')
+        sts = _client(session, 'sts')
         identity = sts.get_caller_identity()
+        _store_cached_identity(credentials_key, identity['Account'])
         print(f"\nCredentials validated successfully!")
         print(f"AWS Account: {identity['Account']}")
-        return aws_region
+        return session
     except ClientError as e:
         print(f"\nError validating AWS credentials: {e}")
         return None
 
-def create_vpc_and_security_group():
-    """Create VPC and Security Group for RDS"""
-    ec2 = boto3.client('ec2')
+def collect_inputs(args):
+    """Gather everything provisioning needs, so it runs without stopping for input"""
+    return {
+        'rds_password': args.rds_password or getpass.getpass("Enter RDS master password: ")
+    }
+
+def _find_existing_network(ec2):
+    """VPC, security group and subnets left by an earlier complete run, if any"""
+    vpcs = ec2.describe_vpcs(Filters=[{'Name': 'tag:Name', 'Values': [_VPC_NAME]}])['Vpcs']
+    for vpc in vpcs:
+        vpc_filter = {'Name': 'vpc-id', 'Values': [vpc['VpcId']]}
+        groups = ec2.describe_security_groups(
+            Filters=[vpc_filter, {'Name': 'group-name', 'Values': [_SECURITY_GROUP_NAME]}]
+        )['SecurityGroups']
+        subnets = ec2.describe_subnets(Filters=[vpc_filter])['Subnets']
+        if groups and len(subnets) >= _SUBNET_COUNT:
+            return vpc['VpcId'], groups[0]['GroupId'], [subnet['SubnetId'] for subnet in subnets[:_SUBNET_COUNT]]
+    return None
+
+def create_vpc_and_security_group(session, on_subnets=None):
+    """Create VPC and Security Group for RDS
+
+    ``on_subnets`` is called with the VPC and subnet IDs as soon as they are available,
+    concurrently with the rest of the network setup.
+    """
+    ec2 = _client(session, 'ec2')
     
     try:
+        # A rerun after a failed RDS step reuses the network instead of creating a second one
+        existing = _find_existing_network(ec2)
+        if existing:
+            print(f"Reusing VPC {existing[0]} from an earlier run...")
+            if on_subnets:
+                on_subnets(existing[0], existing[2])
+            return existing
+        
         # Create VPC
         print("Creating VPC...")
         vpc = ec2.create_vpc(
             CidrBlock='10.0.0.0/16',
             TagSpecifications=[{
                 'ResourceType': 'vpc',
-                'Tags': [{'Key': 'Name', 'Value': 'code-reviewer-vpc'}]
+                'Tags': [{'Key': 'Name', 'Value': _VPC_NAME}]
             }]
         )
         vpc_id = vpc['Vpc']['VpcId']
+        # Waiters poll until the resource is ready, so they return as soon as it is; vpc_exists
+        # retries while EC2 does not list the new VPC yet, which vpc_available would fail on
+        ec2.get_waiter('vpc_exists').wait(VpcIds=[vpc_id])
+        ec2.get_waiter('vpc_available').wait(VpcIds=[vpc_id])
         
-        # Enable DNS support and hostnames
-        ec2.modify_vpc_attribute(VpcId=vpc_id, EnableDnsSupport={'Value': True})
-        ec2.modify_vpc_attribute(VpcId=vpc_id, EnableDnsHostnames={'Value': True})
-        
-        # Create Internet Gateway
-        igw = ec2.create_internet_gateway()
-        igw_id = igw['InternetGateway']['InternetGatewayId']
-        ec2.attach_internet_gateway(InternetGatewayId=igw_id, VpcId=vpc_id)
-        
-        # Create subnets
-        azs = ec2.describe_availability_zones()
-        az_names = [az['ZoneName'] for az in azs['AvailabilityZones']][:2]
-        subnet_ids = []
-        
-        for i, az in enumerate(az_names):
-            subnet = ec2.create_subnet(
-                VpcId=vpc_id,
-                CidrBlock=f'10.0.{i}.0/24',
-                AvailabilityZone=az
+        with ThreadPoolExecutor(max_workers=_MAX_SETUP_WORKERS) as pool:
+            # These calls only need the VPC, so they run concurrently instead of one round trip at a time
+            dns_updates = [
+                pool.submit(ec2.modify_vpc_attribute, VpcId=vpc_id, EnableDnsSupport={'Value': True}),
+                pool.submit(ec2.modify_vpc_attribute, VpcId=vpc_id, EnableDnsHostnames={'Value': True})
+            ]
+            igw_future = pool.submit(ec2.create_internet_gateway)
+            # Only usable zones are returned, leaving out impaired zones and Local or Wavelength Zones
+            azs_future = pool.submit(
+                ec2.describe_availability_zones,
+                Filters=[
+                    {'Name': 'state', 'Values': ['available']},
+                    {'Name': 'zone-type', 'Values': ['availability-zone']}
+                ]
             )
-            subnet_id = subnet['Subnet']['SubnetId']
-            subnet_ids.append(subnet_id)
+            route_table_future = pool.submit(ec2.create_route_table, VpcId=vpc_id)
             
-            # Make subnet public
-            ec2.modify_subnet_attribute(
-                SubnetId=subnet_id,
-                MapPublicIpOnLaunch={'Value': True}
-            )
-        
-        # Create and configure route table
-        route_table = ec2.create_route_table(VpcId=vpc_id)
-        route_table_id = route_table['RouteTable']['RouteTableId']
-        
-        # Add route to internet gateway
-        ec2.create_route(
-            RouteTableId=route_table_id,
-            DestinationCidrBlock='0.0.0.0/0',
-            GatewayId=igw_id
-        )
-        
-        # Associate route table with subnets
-        for subnet_id in subnet_ids:
-            ec2.associate_route_table(
+            # Create subnets
+            az_names = [az['ZoneName'] for az in azs_future.result()['AvailabilityZones']][:_SUBNET_COUNT]
+            subnet_futures = [
+                pool.submit(ec2.create_subnet, VpcId=vpc_id, CidrBlock=f'10.0.{i}.0/24', AvailabilityZone=az)
+                for i, az in enumerate(az_names)
+            ]
+            
+            # Attach Internet Gateway
+            igw_id = igw_future.result()['InternetGateway']['InternetGatewayId']
+            ec2.attach_internet_gateway(InternetGatewayId=igw_id, VpcId=vpc_id)
+            
+            # Add route to internet gateway
+            route_table_id = route_table_future.result()['RouteTable']['RouteTableId']
+            ec2.create_route(
                 RouteTableId=route_table_id,
-                SubnetId=subnet_id
+                DestinationCidrBlock='0.0.0.0/0',
+                GatewayId=igw_id
             )
-        
-        # Create Security Group
-        security_group = ec2.create_security_group(
-            GroupName='code-reviewer-sg',
-            Description='Security group for Code Reviewer RDS',
-            VpcId=vpc_id
-        )
-        sg_id = security_group['GroupId']
-        
-        # Add inbound rules
-        ec2.authorize_security_group_ingress(
-            GroupId=sg_id,
-            IpPermissions=[
-                {
-                    'IpProtocol': 'tcp',
-                    'FromPort': 5432,
-                    'ToPort': 5432,
-                    'IpRanges': [{'CidrIp': '0.0.0.0/0'}]
-                }
+            
+            subnet_ids = [future.result()['Subnet']['SubnetId'] for future in subnet_futures]
+            create_waiter_with_client('SubnetsAvailable', _SUBNET_WAITERS, ec2).wait(SubnetIds=subnet_ids)
+            
+            # Make subnets public and associate the route table with them
+            subnet_updates = [
+                pool.submit(ec2.modify_subnet_attribute, SubnetId=subnet_id, MapPublicIpOnLaunch={'Value': True})
+                for subnet_id in subnet_ids
+            ] + [
+                pool.submit(ec2.associate_route_table, RouteTableId=route_table_id, SubnetId=subnet_id)
+                for subnet_id in subnet_ids
             ]
-        )
-        
-        # Wait for resources to be ready
-        time.sleep(30)
+            background = [pool.submit(on_subnets, vpc_id, subnet_ids)] if on_subnets else []
+            
+            # Create Security Group
+            security_group = ec2.create_security_group(
+                GroupName=_SECURITY_GROUP_NAME,
+                Description='Security group for Code Reviewer RDS',
+                VpcId=vpc_id
+            )
+            sg_id = security_group['GroupId']
+            ec2.get_waiter('security_group_exists').wait(GroupIds=[sg_id])
+            
+            # Add inbound rules
+            ec2.authorize_security_group_ingress(
+                GroupId=sg_id,
+                IpPermissions=[
+                    {
+                        'IpProtocol': 'tcp',
+                        'FromPort': 5432,
+                        'ToPort': 5432,
+                        'IpRanges': [{'CidrIp': '0.0.0.0/0'}]
+                    }
+                ]
+            )
+            
+            # result() re-raises any ClientError from the worker threads
+            for future in dns_updates + subnet_updates + background:
+                future.result()
         
         return vpc_id, sg_id, subnet_ids
         
-    except ClientError as e:
+    except (ClientError, WaiterError) as e:
         print(f"Error creating VPC and Security Group: {e}")
         return None, None, None
 
-def create_rds_instance(security_group_id, vpc_id, subnet_ids):
+def create_db_subnet_group(session, vpc_id, subnet_ids):
+    """Create the RDS subnet group over the VPC subnets"""
+    rds = _client(session, 'rds')
+    try:
+        groups = rds.describe_db_subnet_groups(DBSubnetGroupName=_DB_SUBNET_GROUP_NAME)['DBSubnetGroups']
+        if groups[0]['VpcId'] == vpc_id:
+            return
+        # Left by a run whose network was not reused; the instance must sit in the security group's VPC
+        print(f"Replacing subnet group {_DB_SUBNET_GROUP_NAME} from VPC {groups[0]['VpcId']}...")
+        rds.delete_db_subnet_group(DBSubnetGroupName=_DB_SUBNET_GROUP_NAME)
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'DBSubnetGroupNotFoundFault':
+            raise
+    rds.create_db_subnet_group(
+        DBSubnetGroupName=_DB_SUBNET_GROUP_NAME,
+        DBSubnetGroupDescription='Subnet group for Code Reviewer RDS',
+        SubnetIds=subnet_ids
+    )
+
+def _db_instance_exists(rds):
+    """Whether an earlier run already requested the instance"""
+    try:
+        rds.describe_db_instances(DBInstanceIdentifier=_DB_INSTANCE_ID)
+        return True
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'DBInstanceNotFound':
+            raise
+        return False
+
+def _create_db_instance(rds, security_group_id, master_password):
+    """Request the RDS PostgreSQL instance"""
+    rds.create_db_instance(
+        DBInstanceIdentifier=_DB_INSTANCE_ID,
+        DBInstanceClass='db.t3.micro',
+        Engine='postgres',
+        MasterUsername='postgres',
+        MasterUserPassword=master_password,
+        AllocatedStorage=20,
+        MaxAllocatedStorage=20,
+        VpcSecurityGroupIds=[security_group_id],
+        DBSubnetGroupName=_DB_SUBNET_GROUP_NAME,
+        DBName='code_reviewer',
+        PubliclyAccessible=True,
+        MultiAZ=False,
+        StorageType='gp2',
+        BackupRetentionPeriod=1
+    )
+    
+    print("RDS instance creation initiated...")
+    print("This may take several minutes to complete.")
+
+def create_rds_instance(session, security_group_id, master_password):
     """Create RDS PostgreSQL instance"""
-    rds = boto3.client('rds')
+    rds = _client(session, 'rds')
     
     try:
-        # Create subnet group
-        subnet_group_name = 'code-reviewer-subnet-group'
-        rds.create_db_subnet_group(
-            DBSubnetGroupName=subnet_group_name,
-            DBSubnetGroupDescription='Subnet group for Code Reviewer RDS',
-            SubnetIds=subnet_ids
-        )
-        
-        # Create RDS instance
-        response = rds.create_db_instance(
-            DBInstanceIdentifier='code-reviewer-db',
-            DBInstanceClass='db.t3.micro',
-            Engine='postgres',
-            MasterUsername='postgres',
-            MasterUserPassword=getpass.getpass("Enter RDS master password: "),
-            AllocatedStorage=20,
-            MaxAllocatedStorage=20,
-            VpcSecurityGroupIds=[security_group_id],
-            DBSubnetGroupName=subnet_group_name,
-            DBName='code_reviewer',
-            PubliclyAccessible=True,
-            MultiAZ=False,
-            StorageType='gp2',
-            BackupRetentionPeriod=1
-        )
-        
-        print("RDS instance creation initiated...")
-        print("This may take several minutes to complete.")
+        if _db_instance_exists(rds):
+            print("RDS instance already exists, waiting for it to be available...")
+        else:
+            _create_db_instance(rds, security_group_id, master_password)
         
         # Wait for RDS instance to be available
         waiter = rds.get_waiter('db_instance_available')
-        waiter.wait(DBInstanceIdentifier='code-reviewer-db')
+        # A t3.micro is usually ready within minutes, so a short poll notices it sooner; 90 polls still allow 15 minutes
+        waiter.wait(
+            DBInstanceIdentifier=_DB_INSTANCE_ID,
+            WaiterConfig={'Delay': 10, 'MaxAttempts': 90}
+        )
         
         # Get the endpoint
-        response = rds.describe_db_instances(DBInstanceIdentifier='code-reviewer-db')
+        response = rds.describe_db_instances(DBInstanceIdentifier=_DB_INSTANCE_ID)
         endpoint = response['DBInstances'][0]['Endpoint']['Address']
         return endpoint
         
-    except ClientError as e:
+    except (ClientError, WaiterError) as e:
         print(f"Error creating RDS instance: {e}")
         return None
 
@@ -177,31 +349,40 @@ def main():
     print("Setting up AWS infrastructure for Code Reviewer...")
     
     # Configure AWS credentials
-    aws_region = configure_aws_credentials()
-    if not aws_region:
+    args = parse_args()
+    session = configure_aws_credentials(args)
+    if not session:
         print("\nSetup aborted: Invalid AWS credentials.")
         return
+    aws_region = session.region_name
+    inputs = collect_inputs(args)
     
-    # Create VPC and Security Group
+    # Create VPC and Security Group; the RDS subnet group is created as soon as the subnets exist
     print("\nCreating VPC and Security Group...")
-    vpc_id, security_group_id, subnet_ids = create_vpc_and_security_group()
+    vpc_id, security_group_id, subnet_ids = create_vpc_and_security_group(
+        session,
+        on_subnets=lambda vpc_id, subnet_ids: create_db_subnet_group(session, vpc_id, subnet_ids)
+    )
     if not all([vpc_id, security_group_id, subnet_ids]):
         print("Failed to create VPC and Security Group. Exiting...")
         return
     
     # Create RDS instance
     print("\nCreating RDS instance...")
-    rds_endpoint = create_rds_instance(security_group_id, vpc_id, subnet_ids)
+    rds_endpoint = create_rds_instance(session, security_group_id, inputs['rds_password'])
     if not rds_endpoint:
         print("Failed to create RDS instance. Exiting...")
         return
     
-    # Save configuration
-    with open('.env', 'w') as f:
-        f.write(f"AWS_REGION={aws_region}\n")
-        f.write(f"DB_HOST={rds_endpoint}\n")
-        f.write(f"DB_NAME=code_reviewer\n")
-        f.write(f"DB_USER=postgres\n")
+    # Save configuration; written to a temporary file first, so a crash never leaves a truncated .env
+    with open('.env.tmp', 'w') as f:
+        f.write(
+            f"AWS_REGION={aws_region}\n"
+            f"DB_HOST={rds_endpoint}\n"
+            f"DB_NAME=code_reviewer\n"
+            f"DB_USER=postgres\n"
+        )
+    os.replace('.env.tmp', '.env')
     
     print("\nAWS infrastructure setup completed!")
     print(f"RDS endpoint: {rds_endpoint}")
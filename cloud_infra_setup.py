@@ -1,7 +1,9 @@
+import argparse
 import subprocess
 import boto3
 import time
 import os
+from concurrent.futures import ThreadPoolExecutor
 
 AWS_REGION = "us-east-1"
 EKS_CLUSTER_NAME = "my-eks-cluster"
@@ -9,6 +11,13 @@ EC2_INSTANCE_TYPE = "t2.micro"
 EC2_AMI_ID = "ami-0c02fb55956c7d316"  # Amazon Linux 2 AMI for us-east-1
 EC2_KEY_NAME = "code-reviewer"  # Replace with your key pair name
 
+def _tool_env(**overrides):
+    """Environment for CLI subprocesses; with static credentials set, their AWS SDKs skip the instance metadata lookup"""
+    env = {**os.environ, **overrides}
+    if env.get("AWS_ACCESS_KEY_ID") and env.get("AWS_SECRET_ACCESS_KEY"):
+        env.setdefault("AWS_EC2_METADATA_DISABLED", "true")
+    return env
+
 # # --- EKS Cluster Creation ---
 # def create_eks_cluster():
 #     print("Creating EKS cluster with 2 t2.micro nodes...")
@@ -50,30 +59,74 @@ EC2_KEY_NAME = "code-reviewer"  # Replace with your key pair name
 #         print(f"Instance {instance.id} is running at {instance.public_dns_name}")
 #     print("All EC2 instances launched.")
 
+# --- Command-line Inputs ---
+def parse_args():
+    """Command-line options; anything not given here or in the environment is prompted for"""
+    parser = argparse.ArgumentParser(description="Build, push and deploy the Code Reviewer image")
+    parser.add_argument("--image", default=os.environ.get("DOCKER_IMAGE"))
+    parser.add_argument("--dockerfile-dir", default=os.environ.get("DOCKERFILE_DIR"))
+    parser.add_argument("--manifest", default=os.environ.get("K8S_MANIFEST"))
+    return parser.parse_args()
+
+def collect_inputs(args):
+    """Gather the build and deploy settings up front, so neither step stops for input"""
+    return {
+        'image_name': args.image or input("Enter Docker image name (e.g., username/repo:tag): ").strip(),
+        'dockerfile_dir': args.dockerfile_dir or input("Enter path to Dockerfile directory (default: .): ").strip() or ".",
+        'manifest_path': args.manifest or input("Enter path to Kubernetes manifest YAML or a directory of them (e.g., deployment.yaml): ").strip(),
+    }
+
 # --- Docker Build and Push ---
-def build_and_push_docker_image():
-    image_name = input("Enter Docker image name (e.g., username/repo:tag): ").strip()
-    dockerfile_dir = input("Enter path to Dockerfile directory (default: .): ").strip() or "."
-    print(f"Building Docker image {image_name}...")
-    subprocess.run(["docker", "build", "-t", image_name, dockerfile_dir], check=True)
-    print(f"Pushing Docker image {image_name}...")
-    subprocess.run(["docker", "push", image_name], check=True)
+def build_and_push_docker_image(image_name, dockerfile_dir):
+    print(f"Building and pushing Docker image {image_name}...")
+    # BuildKit uploads layers as they are built, and the pushed image carries its own layer cache for the next build
+    subprocess.run(
+        [
+            "docker", "buildx", "build", "--push",
+            "--cache-to=type=inline",
+            f"--cache-from=type=registry,ref={image_name}",
+            "-t", image_name, dockerfile_dir,
+        ],
+        env=_tool_env(DOCKER_BUILDKIT="1"),
+        check=True,
+    )
     print("Docker image pushed.")
     return image_name
 
 # --- Kubernetes Deployment ---
-def deploy_to_eks():
-    manifest_path = input("Enter path to Kubernetes manifest YAML (e.g., deployment.yaml): ").strip()
+def preview_deployment(manifest_path):
+    """Return what applying the manifests would change; kubectl diff exits with 1 when there are changes"""
+    result = subprocess.run(
+        ["kubectl", "diff", "--server-side", "--force-conflicts", "-f", manifest_path],
+        capture_output=True,
+        text=True,
+        env=_tool_env(),
+    )
+    if result.returncode > 1:
+        raise subprocess.CalledProcessError(result.returncode, result.args, result.stdout, result.stderr)
+    return result.stdout
+
+def deploy_to_eks(manifest_path):
     print(f"Deploying {manifest_path} to EKS...")
-    subprocess.run(["kubectl", "apply", "-f", manifest_path], check=True)
+    # A directory applies all its manifests in one kubectl run; server-side apply leaves the diffing to the API server
+    subprocess.run(
+        ["kubectl", "apply", "--server-side", "--force-conflicts", "-f", manifest_path],
+        env=_tool_env(),
+        check=True,
+    )
     print("Deployment applied.")
 
 if __name__ == "__main__":
+    inputs = collect_inputs(parse_args())
     # 1. Create EKS cluster
     # create_eks_cluster()
     # 2. Launch 2 EC2 instances
     # create_ec2_instances(2)
     # 3. Build and push Docker image
-    image_name = build_and_push_docker_image()
+    # The diff only reads cluster state, so it runs while the image builds; a bad manifest still fails before deploying
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        preview = pool.submit(preview_deployment, inputs['manifest_path'])
+        image_name = build_and_push_docker_image(inputs['image_name'], inputs['dockerfile_dir'])
+        print(preview.result() or "No changes to the deployed manifests.")
     # 4. Deploy to EKS
-    deploy_to_eks() 
\ No newline at end of file
+    deploy_to_eks(inputs['manifest_path']) 
\ No newline at end of file
@@ -0,0 +1,22 @@
+"""Add created_at indexes to code_analyses
+
+Revision ID: add_analysis_created_at_indexes
+Revises: add_blob_cache_table
+Create Date: 2026-10-14 00:00:00.000000
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'add_analysis_created_at_indexes'
+down_revision = 'add_blob_cache_table'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_index('ix_analysis_created_at', 'code_analyses', ['created_at'])
+    op.create_index('ix_analysis_repo_created', 'code_analyses', ['repository', 'created_at'])
+
+def downgrade():
+    op.drop_index('ix_analysis_repo_created', table_name='code_analyses')
+    op.drop_index('ix_analysis_created_at', table_name='code_analyses')
@@ -0,0 +1,31 @@
+"""Add partial index on labeled code_analyses
+
+Revision ID: add_analysis_labeled_index
+Revises: add_analysis_created_at_indexes
+Create Date: 2026-10-14 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_analysis_labeled_index'
+down_revision = 'add_analysis_created_at_indexes'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # Built concurrently so writes to code_analyses are not blocked on PostgreSQL
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_analysis_labeled',
+            'code_analyses',
+            ['label'],
+            postgresql_where=sa.text('label IS NOT NULL'),
+            postgresql_concurrently=True,
+            sqlite_where=sa.text('label IS NOT NULL'),
+        )
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_analysis_labeled', table_name='code_analyses', postgresql_concurrently=True)
@@ -0,0 +1,25 @@
+"""Stamp code_analyses timestamps on the server
+
+Revision ID: add_analysis_timestamp_defaults
+Revises: add_analysis_labeled_index
+Create Date: 2026-10-14 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_analysis_timestamp_defaults'
+down_revision = 'add_analysis_labeled_index'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    with op.batch_alter_table('code_analyses') as batch_op:
+        batch_op.alter_column('created_at', server_default=sa.func.now())
+        batch_op.alter_column('updated_at', server_default=sa.func.now())
+
+def downgrade():
+    with op.batch_alter_table('code_analyses') as batch_op:
+        batch_op.alter_column('updated_at', server_default=None)
+        batch_op.alter_column('created_at', server_default=None)
@@ -0,0 +1,28 @@
+"""Add blob_cache table
+
+Revision ID: add_blob_cache_table
+Revises: auto_add_label_column
+Create Date: 2026-10-14 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_blob_cache_table'
+down_revision = 'auto_add_label_column'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        'blob_cache',
+        sa.Column('repository', sa.String(), nullable=False),
+        sa.Column('path', sa.String(), nullable=False),
+        sa.Column('etag', sa.String(), nullable=False),
+        sa.Column('content', sa.String(), nullable=True),
+        sa.PrimaryKeyConstraint('repository', 'path')
+    )
+
+def downgrade():
+    op.drop_table('blob_cache')
@@ -15,7 +15,10 @@ branch_labels = None
 depends_on = None
 
 def upgrade():
-    op.add_column('code_analyses', sa.Column('label', sa.Integer(), nullable=True))
+    # A nullable column without a server default is added in place, with no table rewrite
+    with op.batch_alter_table('code_analyses') as batch_op:
+        batch_op.add_column(sa.Column('label', sa.Integer(), nullable=True))
 
 def downgrade():
-    op.drop_column('code_analyses', 'label') 
\ No newline at end of file
+    with op.batch_alter_table('code_analyses') as batch_op:
+        batch_op.drop_column('label') 
\ No newline at end of file